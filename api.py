@@ -0,0 +1,318 @@
+import gzip
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, abort, current_app
+from flask_login import current_user
+from sqlalchemy.orm import joinedload, load_only
+from werkzeug.exceptions import HTTPException
+
+from models import (
+    Artifact, Museum, Log,
+    Category, Dynasty, Image, MotifAndPattern, ObjectType, FormAndStructure
+)
+from facets import GLOBAL_FACETS, parse_filters, artifact_query
+from pagination import keyset_paginate
+from batch import ArtifactBatch
+from cache import cached_museum_stats
+from stats import EMPTY_STATS, USAGE_KINDS, stats_dict, label_usage, daily_activity
+
+try:
+    import brotli  # 可选依赖：安装后支持 Accept-Encoding: br
+except ImportError:
+    brotli = None
+
+# ==============================
+# JSON API（/api/v1）
+# ==============================
+#
+# 面向下游系统的接口（除批量写入外均为只读），统一约定：
+#   fields=a,b,c   只返回指定字段（关联字段只有被请求时才预加载）
+#   ids=1,2,3      按 id 批量获取，一次最多 API_MAX_PAGE_SIZE 个
+#   limit=N        每页条数，默认 API_DEFAULT_PAGE_SIZE
+#   after/before   上一次响应中的 next_cursor / prev_cursor
+# 响应带弱 ETag，客户端用 If-None-Match 复查时未变化返回 304；
+# 较大的响应按 Accept-Encoding 压缩（br 优先，其次 gzip）。
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# 关联字段：字段名 -> (关系属性, 输出时取的列)
+_LABEL = ('id', 'name')
+
+ARTIFACT_COLUMNS = ('id', 'museum_id', 'name', 'description')
+ARTIFACT_RELATIONS = {
+    'museum': (Artifact.museum, _LABEL),
+    'category': (Artifact.category, _LABEL),
+    'dynasty': (Artifact.dynasty, _LABEL),
+    'motif': (Artifact.motif, _LABEL),
+    'object_type': (Artifact.object_type, _LABEL),
+    'form_structure': (Artifact.form_structure, _LABEL),
+    'image': (Artifact.image, ('id', 'url')),
+}
+
+# /api/v1/labels/<kind> 支持的标签表
+LABEL_KINDS = {
+    'category': (Category, _LABEL),
+    'dynasty': (Dynasty, _LABEL),
+    'motif': (MotifAndPattern, _LABEL),
+    'object_type': (ObjectType, _LABEL),
+    'form_structure': (FormAndStructure, _LABEL),
+    'image': (Image, ('id', 'url')),
+}
+
+LOG_COLUMNS = ('id', 'timestamp', 'table_name', 'record_id', 'action', 'user_id')
+
+
+@api.before_request
+def require_login():
+    # 与网页共用登录会话；未登录时返回 401 而不是跳转到登录页
+    if not current_user.is_authenticated:
+        abort(401)
+
+
+@api.errorhandler(HTTPException)
+def json_error(e):
+    return jsonify(error=e.name, message=e.description), e.code
+
+
+@api.after_request
+def finalize(response):
+    """加 ETag 并处理 If-None-Match，然后按需压缩"""
+    if request.method == 'GET' and response.status_code == 200:
+        # 弱 ETag：压缩前后的内容在语义上相同，可以共用
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+    return _compress(response)
+
+
+# ---------- 接口 ----------
+
+@api.route('/artifacts')
+def artifacts():
+    """文物列表，可按 museum 及各分面筛选；按 id 升序分页，适合增量同步"""
+    fields = _fields(ARTIFACT_COLUMNS + tuple(ARTIFACT_RELATIONS))
+    museum_id = request.args.get('museum', type=int)
+    filters = parse_filters(request.args, GLOBAL_FACETS)
+    filters.pop('museum', None)
+    query = _artifact_options(artifact_query(museum_id, filters), fields)
+    return _list_response(query, Artifact, fields, _serialize_artifact)
+
+
+@api.route('/artifacts/<int:id>')
+def artifact(id):
+    fields = _fields(ARTIFACT_COLUMNS + tuple(ARTIFACT_RELATIONS))
+    item = _artifact_options(Artifact.query, fields).filter(Artifact.id == id).first_or_404()
+    return jsonify(data=_serialize_artifact(item, fields))
+
+
+@api.route('/artifacts/batch', methods=['POST'])
+def artifacts_batch():
+    """
+    批量新建/修改/删除文物（仅管理员），请求体：
+    {"atomic": true, "operations": [{"op": "create", "museum_id": 1, "name": "...", "category": "..."},
+                                    {"op": "update", "id": 5, "dynasty": "明"}, {"op": "delete", "id": 7}]}
+    每个操作在 results 中有一条对应结果（ok / id 或 error）。
+    """
+    if current_user.role != 'admin':
+        abort(403)
+    # 只接受 JSON：浏览器跨站表单无法伪造此类请求
+    if not request.is_json:
+        abort(415, '请求体必须是 application/json')
+    payload = request.get_json(silent=True)
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        abort(400, 'operations 必须是非空数组')
+    limit = current_app.config['API_BATCH_MAX_OPS']
+    if len(operations) > limit:
+        abort(413, f'每批最多 {limit} 个操作')
+
+    batch = ArtifactBatch(operations, user_id=current_user.id, atomic=payload.get('atomic', True) is not False)
+    results = batch.run()
+    status = 422 if batch.atomic and batch.failed else 200
+    return jsonify(results=results, applied=batch.applied, failed=batch.failed), status
+
+
+@api.route('/museums')
+def museums():
+    fields = _fields(_LABEL)
+    return _list_response(Museum.query.options(load_only(*_attrs(Museum, fields))),
+                          Museum, fields, _serialize_columns)
+
+
+@api.route('/museums/stats')
+def museums_stats():
+    """全部博物馆的统计（一条 GROUP BY 查询，带缓存），按博物馆 id 排列"""
+    stats = cached_museum_stats()
+    museum_ids = [row[0] for row in Museum.query.with_entities(Museum.id).order_by(Museum.id)]
+    return jsonify(data=[dict(museum_id=mid, **stats_dict(stats.get(mid, EMPTY_STATS))) for mid in museum_ids])
+
+
+@api.route('/museums/<int:id>/stats')
+def museum_stats(id):
+    """单个博物馆的文物总数、有无图片及按类别/朝代的分布"""
+    Museum.query.get_or_404(id)
+    stats = cached_museum_stats(id).get(id, EMPTY_STATS)
+    return jsonify(data=dict(museum_id=id, **stats_dict(stats)))
+
+
+@api.route('/stats/labels/<kind>')
+def label_usage_stats(kind):
+    """某类标签按使用次数的排行（来自统计汇总表），limit 默认 API_DEFAULT_PAGE_SIZE"""
+    if kind not in USAGE_KINDS:
+        abort(404)
+    return jsonify(data=[item._asdict() for item in label_usage(kind, limit=_limit())])
+
+
+@api.route('/stats/activity')
+def activity_stats():
+    """按天的操作量（仅管理员），可用 days（默认 30）、table_name、action 筛选"""
+    if current_user.role != 'admin':
+        abort(403)
+    days = max(1, request.args.get('days', 30, type=int))
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = daily_activity(start, request.args.get('table_name'), request.args.get('action'))
+    return jsonify(data=[{'day': row.day.isoformat(), 'table_name': row.table_name,
+                          'action': row.action, 'total': row.total} for row in rows])
+
+
+@api.route('/labels/<kind>')
+def labels(kind):
+    if kind not in LABEL_KINDS:
+        abort(404)
+    model, columns = LABEL_KINDS[kind]
+    fields = _fields(columns)
+    return _list_response(model.query.options(load_only(*_attrs(model, fields))),
+                          model, fields, _serialize_columns)
+
+
+@api.route('/logs')
+def logs():
+    """操作日志（仅管理员），筛选参数与 /admin/logs 相同；按时间倒序分页"""
+    if current_user.role != 'admin':
+        abort(403)
+    from routes import _filtered_logs, _decode_log_cursor
+    fields = _fields(LOG_COLUMNS)
+    query, _ = _filtered_logs(request.args)
+    # timestamp 是分页游标的一部分，即使未请求也要加载
+    query = query.options(load_only(*_attrs(Log, fields), Log.timestamp))
+    if 'ids' in request.args:
+        return _ids_response(query, Log, fields, _serialize_columns)
+    page = keyset_paginate(
+        query, (Log.timestamp, Log.id), per_page=_limit(),
+        after=request.args.get('after'), before=request.args.get('before'),
+        count_mode='none', descending=True, decode=_decode_log_cursor
+    )
+    return _page_response(page, fields, _serialize_columns)
+
+
+# ---------- 查询与序列化 ----------
+
+def _fields(allowed):
+    """解析 fields 参数；未指定时返回全部字段，id 总是包含在内"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        abort(400, f'未知字段：{", ".join(unknown)}，可选：{", ".join(allowed)}')
+    return ['id'] + [f for f in fields if f != 'id']
+
+
+def _attrs(model, fields):
+    return [getattr(model, f) for f in fields]
+
+
+def _artifact_options(query, fields):
+    """只加载请求的列；关联字段用 joinedload 一次查出"""
+    columns = [f for f in fields if f in ARTIFACT_COLUMNS]
+    options = [load_only(*_attrs(Artifact, columns))]
+    for f in fields:
+        if f in ARTIFACT_RELATIONS:
+            relation, label_columns = ARTIFACT_RELATIONS[f]
+            options.append(joinedload(relation).load_only(*_attrs(relation.property.mapper.class_, label_columns)))
+    return query.options(*options)
+
+
+def _serialize_columns(item, fields):
+    data = {}
+    for f in fields:
+        value = getattr(item, f)
+        data[f] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return data
+
+
+def _serialize_artifact(item, fields):
+    data = {}
+    for f in fields:
+        if f in ARTIFACT_RELATIONS:
+            related = getattr(item, f)
+            columns = ARTIFACT_RELATIONS[f][1]
+            data[f] = {c: getattr(related, c) for c in columns} if related is not None else None
+        else:
+            data[f] = getattr(item, f)
+    return data
+
+
+def _limit():
+    default = current_app.config['API_DEFAULT_PAGE_SIZE']
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def _list_response(query, model, fields, serialize):
+    if 'ids' in request.args:
+        return _ids_response(query, model, fields, serialize)
+    page = keyset_paginate(
+        query, (model.id,), per_page=_limit(),
+        after=request.args.get('after'), before=request.args.get('before'),
+        count_mode='none'
+    )
+    return _page_response(page, fields, serialize)
+
+
+def _ids_response(query, model, fields, serialize):
+    """?ids=1,2,3 批量获取，返回顺序与请求一致，找不到的 id 列在 missing 中"""
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.args['ids'].split(',') if i.strip()))
+    except ValueError:
+        abort(400, 'ids 必须是逗号分隔的整数')
+    if len(ids) > current_app.config['API_MAX_PAGE_SIZE']:
+        abort(400, f'ids 最多 {current_app.config["API_MAX_PAGE_SIZE"]} 个')
+    found = {item.id: item for item in query.filter(model.id.in_(ids))} if ids else {}
+    return jsonify(
+        data=[serialize(found[i], fields) for i in ids if i in found],
+        missing=[i for i in ids if i not in found]
+    )
+
+
+def _page_response(page, fields, serialize):
+    return jsonify(
+        data=[serialize(item, fields) for item in page.items],
+        has_next=page.has_next,
+        has_prev=page.has_prev,
+        next_cursor=page.next_cursor if page.has_next else None,
+        prev_cursor=page.prev_cursor if page.has_prev else None
+    )
+
+
+# ---------- 压缩 ----------
+
+def _compress(response):
+    if response.direct_passthrough or response.status_code != 200 \
+            or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < current_app.config['API_COMPRESS_MIN_SIZE']:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        data, encoding = brotli.compress(data, quality=5), 'br'
+    elif accepted['gzip']:
+        data, encoding = gzip.compress(data, compresslevel=6), 'gzip'
+    else:
+        return response
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -3,12 +3,20 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import Config
 from models import db
+from cache import init_cache
+from search import init_search
+from images import init_images
+from templating import init_templating
 
 app = Flask(__name__) # 创建flask应用实例
 app.config.from_object(Config) #加载配置
 
 db.init_app(app) # 绑定数据库
 migrate = Migrate(app, db)
+init_cache(app)  # 进程内缓存
+init_search(app)  # 全文搜索索引
+init_images(app)  # 图片缓存与缩略图
+init_templating(app)  # 模板字节码缓存、片段缓存与渲染耗时统计
 
 
 login_manager = LoginManager()
@@ -17,10 +25,17 @@ login_manager.login_view = 'login'  # 未登录时重新路由到/login
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    # 已登录请求一般直接命中进程内缓存，不查询 user 表
+    from cache import load_cached_user
+    return load_cached_user(int(user_id))
 
 from routes import *  # 导入路由
+import commands  # 注册命令行工具（flask explain-artifacts 等）
+from api import api
+app.register_blueprint(api)  # JSON API（/api/v1）
+
+from retention import start_scheduler
+start_scheduler(app)  # 定时归档过期日志（LOG_RETENTION_INTERVAL 为 0 时不启动）
 
 if __name__ == '__main__':
     app.run(debug=True)  # 调试模式，显示错误
\ No newline at end of file
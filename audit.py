@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import insert
+
+from models import (
+    db, User, Artifact, Museum, Log,
+    Category, Dynasty, Image,
+    MotifAndPattern, ObjectType, FormAndStructure
+)
+from stats import record_activity
+
+# ==============================
+# 操作日志（审计）管道
+# ==============================
+
+# 需要记录日志的模型（Log 本身除外，避免无限循环）
+AUDITED_MODELS = {Artifact, Museum, Category, Dynasty, Image,
+                  MotifAndPattern, ObjectType, FormAndStructure, User}
+
+
+def collect_audit(session):
+    """
+    before_flush 中调用：把本次 flush 要记录的操作以元组形式暂存到 session.info，
+    每个会话（即每个请求/每个后台线程）各自一份，互不干扰。
+    元组为 (动作, 表名, 记录 id, 实例)；新建对象此时还没有 id，先保存实例。
+    """
+    pending = session.info.setdefault('audit_pending', [])
+
+    for instance in session.new:
+        if type(instance) in AUDITED_MODELS:
+            pending.append(('create', type(instance).__name__, None, instance))
+
+    for instance in session.dirty:
+        if type(instance) in AUDITED_MODELS and session.is_modified(instance) and instance.id:
+            pending.append(('update', type(instance).__name__, instance.id, None))
+
+    for instance in session.deleted:
+        if type(instance) in AUDITED_MODELS and instance.id:
+            pending.append(('delete', type(instance).__name__, instance.id, None))
+
+
+def write_audit(session):
+    """
+    after_flush_postexec 中调用：此时新对象的 id 已生成，
+    用一条多行 INSERT 写入本次 flush 的全部日志，与业务数据在同一事务中提交或回滚。
+    """
+    pending = session.info.pop('audit_pending', None)
+    if not pending:
+        return
+
+    user_id = _current_user_id()
+    timestamp = datetime.utcnow()
+    rows = []
+    for action, table_name, record_id, instance in pending:
+        if record_id is None and instance is not None:
+            record_id = instance.id
+        if record_id is None:
+            continue
+        rows.append({
+            'table_name': table_name,
+            'record_id': record_id,
+            'action': action,
+            'user_id': user_id,
+            'timestamp': timestamp,
+        })
+    if rows:
+        # 直接走连接执行，不产生 ORM 对象，也不会再次触发 flush
+        session.connection().execute(insert(Log.__table__), rows)
+        record_activity(session.connection(), rows)
+
+
+def discard_audit(session):
+    """事务回滚时丢弃尚未写入的日志"""
+    session.info.pop('audit_pending', None)
+
+
+def bulk_log(table_name, action, count, user_id=None):
+    """批量操作只记录一条汇总日志（如 'bulk_create 500'），而不是每个对象一条"""
+    rows = [{
+        'table_name': table_name,
+        'record_id': None,
+        'action': f'{action} {count}',
+        'user_id': user_id,
+        'timestamp': datetime.utcnow(),
+    }]
+    db.session.execute(insert(Log), rows)
+    record_activity(db.session.connection(), rows)
+
+
+def _current_user_id():
+    # 后台线程、命令行中没有请求上下文，记为未知用户
+    if not has_request_context():
+        return None
+    try:
+        return current_user.id if current_user.is_authenticated else None
+    except Exception:
+        return None
@@ -0,0 +1,191 @@
+from labels import LabelResolver, DEFAULT_LABELS, LABEL_COLUMNS, LABEL_FIELDS
+from models import db, Artifact, Museum
+
+# ==============================
+# 文物批量写入（POST /api/v1/artifacts/batch）
+# ==============================
+
+OPERATIONS = ('create', 'update', 'delete')
+
+NAME_MAX_LENGTH = Artifact.__table__.c.name.type.length
+
+
+class BatchError(ValueError):
+    """单个操作的校验错误，信息会原样返回给调用方"""
+
+
+class ArtifactBatch:
+    """
+    一次请求中的一批文物 create/update/delete 操作：
+    1. 逐条校验格式，再用一次查询确认涉及的博物馆、文物是否存在；
+    2. 所有操作引用的标签合并后，用 LabelResolver 一轮解析/创建；
+    3. 通过 ORM 一次 flush、一次提交（操作日志、缓存失效、搜索索引由 flush 钩子处理）。
+
+    atomic=True 时任一操作校验失败则整批不执行；
+    atomic=False 时跳过失败的操作，其余照常提交，提交出错再逐条重试以定位出错的操作。
+    """
+
+    def __init__(self, operations, user_id=None, atomic=True):
+        self.operations = operations
+        self.user_id = user_id
+        self.atomic = atomic
+        self.labels = LabelResolver(user_id)
+        self.results = [None] * len(operations)
+
+    @property
+    def applied(self):
+        return sum(1 for r in self.results if r and r['ok'])
+
+    @property
+    def failed(self):
+        return sum(1 for r in self.results if r and not r['ok'])
+
+    def run(self):
+        items = self._validate()
+        if self.atomic and self.failed:
+            for index, item in items:
+                self.results[index] = {'index': index, 'op': item['op'], 'ok': False,
+                                       'error': '同批其他操作有错误，整批未执行'}
+            return self.results
+        if not items:
+            return self.results
+
+        try:
+            self._apply(items)
+            db.session.commit()
+            self._succeed(items)
+        except Exception as e:
+            db.session.rollback()
+            self.labels.reset()
+            if self.atomic:
+                for index, item in items:
+                    self._fail(index, item['op'], str(e))
+            else:
+                self._apply_one_by_one(items)
+        finally:
+            self.labels.invalidate()
+        return self.results
+
+    # ---------- 校验 ----------
+
+    def _validate(self):
+        """返回 [(序号, 规范化后的操作)]，不合法的操作直接记入 results"""
+        items = []
+        for index, raw in enumerate(self.operations):
+            try:
+                items.append((index, self._normalize(raw)))
+            except BatchError as e:
+                self._fail(index, raw.get('op') if isinstance(raw, dict) else None, str(e))
+
+        # 一次查询确认引用的博物馆与文物
+        museum_ids = {item['museum_id'] for _, item in items if 'museum_id' in item}
+        existing_museums = {row[0] for row in db.session.query(Museum.id).filter(Museum.id.in_(museum_ids))} \
+            if museum_ids else set()
+        artifact_ids = [item['id'] for _, item in items if 'id' in item]
+        self.artifacts = {a.id: a for a in Artifact.query.filter(Artifact.id.in_(artifact_ids))} \
+            if artifact_ids else {}
+
+        valid, seen = [], set()
+        for index, item in items:
+            if 'museum_id' in item and item['museum_id'] not in existing_museums:
+                self._fail(index, item['op'], f'博物馆 {item["museum_id"]} 不存在')
+            elif 'id' in item and item['id'] not in self.artifacts:
+                self._fail(index, item['op'], f'文物 {item["id"]} 不存在')
+            elif 'id' in item and item['id'] in seen:
+                self._fail(index, item['op'], f'文物 {item["id"]} 在同一批中被重复操作')
+            else:
+                seen.add(item.get('id'))
+                valid.append((index, item))
+        return valid
+
+    @staticmethod
+    def _normalize(raw):
+        if not isinstance(raw, dict):
+            raise BatchError('每个操作必须是 JSON 对象')
+        op = raw.get('op')
+        if op not in OPERATIONS:
+            raise BatchError(f'op 必须是 {" / ".join(OPERATIONS)} 之一')
+
+        item = {'op': op}
+        if op in ('update', 'delete'):
+            item['id'] = _integer(raw, 'id')
+        if op == 'delete':
+            return item
+
+        if op == 'create' or 'museum_id' in raw:
+            item['museum_id'] = _integer(raw, 'museum_id')
+        if op == 'create' or 'name' in raw:
+            name = _text(raw, 'name')
+            if not name:
+                raise BatchError('name 不能为空')
+            if len(name) > NAME_MAX_LENGTH:
+                raise BatchError(f'name 不能超过 {NAME_MAX_LENGTH} 个字符')
+            item['name'] = name
+        if 'description' in raw:
+            item['description'] = _text(raw, 'description')
+        for field, column in LABEL_FIELDS.items():
+            if field in raw:
+                item[field] = _text(raw, field)
+            elif op == 'create':
+                item[field] = DEFAULT_LABELS.get(column)
+        return item
+
+    # ---------- 执行 ----------
+
+    def _apply(self, items):
+        # 所有操作引用的标签一轮解析
+        self.labels.resolve_all({column: {item.get(field) for _, item in items}
+                                 for field, column in LABEL_FIELDS.items()})
+
+        for index, item in items:
+            op = item['op']
+            if op == 'delete':
+                db.session.delete(self.artifacts[item['id']])
+                continue
+            artifact = Artifact() if op == 'create' else self.artifacts[item['id']]
+            for attr in ('museum_id', 'name', 'description'):
+                if attr in item:
+                    setattr(artifact, attr, item[attr])
+            for field, column in LABEL_FIELDS.items():
+                if field in item:
+                    setattr(artifact, LABEL_COLUMNS[column][2], self.labels.id_of(column, item[field]))
+            if op == 'create':
+                db.session.add(artifact)
+                item['artifact'] = artifact
+
+    def _apply_one_by_one(self, items):
+        """整批提交失败时逐条重试，定位出错的操作"""
+        for index, item in items:
+            try:
+                self._apply([(index, item)])
+                db.session.commit()
+                self._succeed([(index, item)])
+            except Exception as e:
+                db.session.rollback()
+                self.labels.reset()
+                self._fail(index, item['op'], str(e))
+
+    def _succeed(self, items):
+        for index, item in items:
+            artifact_id = item['artifact'].id if item['op'] == 'create' else item['id']
+            self.results[index] = {'index': index, 'op': item['op'], 'ok': True, 'id': artifact_id}
+
+    def _fail(self, index, op, message):
+        self.results[index] = {'index': index, 'op': op, 'ok': False, 'error': message}
+
+
+def _integer(raw, key):
+    value = raw.get(key)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise BatchError(f'{key} 必须是整数')
+    return value
+
+
+def _text(raw, key):
+    """字符串字段：去掉首尾空白，空字符串与 null 都视为清空"""
+    value = raw.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise BatchError(f'{key} 必须是字符串')
+    return value.strip() or None
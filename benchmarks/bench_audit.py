@@ -0,0 +1,75 @@
+"""
+操作日志开销基准：在同一批写入上对比
+  none    不记录日志
+  legacy  旧做法：每个对象在 flush 后追加一个 Log ORM 对象（触发第二轮 flush）
+  batched 现在的做法：按会话暂存元组，每次 flush 一条多行 INSERT
+输出每次被审计写入的平均耗时（微秒）。
+
+用法：python benchmarks/bench_audit.py [--objects 10000] [--flush-size 500]
+"""
+import argparse
+import time
+
+from _common import setup_app, reset_db
+
+
+def legacy_write(session):
+    """旧版 after_flush_postexec 的等价实现，仅用于对比"""
+    from models import Log
+    for action, table_name, record_id, instance in session.info.pop('audit_pending', []):
+        if record_id is None and instance is not None:
+            record_id = instance.id
+        session.add(Log(table_name=table_name, record_id=record_id, action=action))
+
+
+def run(app, mode, objects, flush_size):
+    import routes
+    import audit
+    from models import db, Artifact, Museum
+
+    collect, write = audit.collect_audit, audit.write_audit
+    if mode == 'none':
+        routes.collect_audit, routes.write_audit = (lambda session: None), (lambda session: None)
+    elif mode == 'legacy':
+        routes.write_audit = legacy_write
+    try:
+        reset_db(app)
+        with app.app_context():
+            museum = Museum(name='benchmark')
+            db.session.add(museum)
+            db.session.commit()
+
+            start = time.perf_counter()
+            # 新建
+            for i in range(0, objects, flush_size):
+                db.session.add_all(Artifact(museum_id=museum.id, name=f'a{j}')
+                                   for j in range(i, min(i + flush_size, objects)))
+                db.session.commit()
+            # 修改
+            ids = [row.id for row in db.session.query(Artifact.id)]
+            for i in range(0, len(ids), flush_size):
+                for artifact in Artifact.query.filter(Artifact.id.in_(ids[i:i + flush_size])):
+                    artifact.name = artifact.name + '!'
+                db.session.commit()
+            elapsed = time.perf_counter() - start
+            return elapsed / (2 * objects) * 1e6
+    finally:
+        routes.collect_audit, routes.write_audit = collect, write
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=10000)
+    parser.add_argument('--flush-size', type=int, default=500)
+    args = parser.parse_args()
+
+    app = setup_app()
+    run(app, 'none', min(args.objects, 1000), args.flush_size)  # 预热
+    results = {mode: run(app, mode, args.objects, args.flush_size) for mode in ('none', 'legacy', 'batched')}
+    print(f'{"mode":<10}{"us/write":>10}{"audit overhead us":>20}')
+    for mode, per_write in results.items():
+        print(f'{mode:<10}{per_write:>10.1f}{per_write - results["none"]:>20.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+导入吞吐量基准：对比旧的逐行导入（iterrows + 每行 6 次 .first() 查询）
+与 BulkImporter 的集合式批量导入，输出每个 data/*.xlsx 的 rows/sec。
+
+用法：python benchmarks/bench_import.py [--legacy-limit 2000] [--batch-size 500]
+"""
+import argparse
+import glob
+import os
+import time
+
+from _common import setup_app, reset_db, ROOT
+
+
+def legacy_import(df, museum_id):
+    """旧版 import_data 中的逐行导入逻辑，仅用于对比"""
+    import pandas as pd
+    from models import (
+        db, Artifact, Category, Dynasty, Image,
+        MotifAndPattern, ObjectType, FormAndStructure
+    )
+
+    count = 0
+    for _, row in df.iterrows():
+        try:
+            category_name = row.get('Category', '未知类别')
+            if pd.isna(category_name):
+                category_name = '未知类别'
+            category = Category.query.filter_by(name=category_name).first() or Category(name=category_name)
+            dynasty_name = row.get('Dynasty', '未知朝代')
+            if pd.isna(dynasty_name):
+                dynasty_name = '未知朝代'
+            dynasty = Dynasty.query.filter_by(name=dynasty_name).first() or Dynasty(name=dynasty_name)
+            image_url = row.get('Image') if pd.notna(row.get('Image')) else None
+            image = Image.query.filter_by(url=image_url).first() or (Image(url=image_url) if image_url else None)
+            motif_name = row.get('MotifAndPattern') if pd.notna(row.get('MotifAndPattern')) else None
+            motif = MotifAndPattern.query.filter_by(name=motif_name).first() or (MotifAndPattern(name=motif_name) if motif_name else None)
+            obj_type_name = row.get('ObjectType') if pd.notna(row.get('ObjectType')) else None
+            obj_type = ObjectType.query.filter_by(name=obj_type_name).first() or (ObjectType(name=obj_type_name) if obj_type_name else None)
+            form_struct_name = row.get('FormAndStructure') if pd.notna(row.get('FormAndStructure')) else None
+            form_struct = FormAndStructure.query.filter_by(name=form_struct_name).first() or (FormAndStructure(name=form_struct_name) if form_struct_name else None)
+            description = row.get('Description') if pd.notna(row.get('Description')) else None
+
+            db.session.add_all([category, dynasty])
+            for obj in (image, motif, obj_type, form_struct):
+                if obj:
+                    db.session.add(obj)
+            db.session.add(Artifact(
+                museum_id=museum_id, name=row['Name'], description=description,
+                category_id=category.id, dynasty_id=dynasty.id,
+                image_id=image.id if image else None,
+                motif_id=motif.id if motif else None,
+                object_type_id=obj_type.id if obj_type else None,
+                form_structure_id=form_struct.id if form_struct else None
+            ))
+            count += 1
+            if count % 50 == 0:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+    db.session.commit()
+    return count
+
+
+def bulk_import(df, museum_id, batch_size):
+    from importer import BulkImporter
+    return BulkImporter(museum_id, batch_size=batch_size).run(df.to_dict('records'))
+
+
+def timed(app, func, df, *args):
+    from models import db, Museum
+    reset_db(app)
+    with app.app_context():
+        museum = Museum(name='benchmark')
+        db.session.add(museum)
+        db.session.commit()
+        start = time.perf_counter()
+        count = func(df, museum.id, *args)
+        return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legacy-limit', type=int, default=2000,
+                        help='旧逻辑只跑前 N 行（逐行导入很慢），0 表示全部')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    import pandas as pd
+    app = setup_app()
+
+    print(f'{"file":<24}{"rows":>8}{"legacy rows/s":>16}{"bulk rows/s":>16}{"speedup":>10}')
+    for path in sorted(glob.glob(os.path.join(ROOT, 'data', '*.xlsx'))):
+        df = pd.read_excel(path)
+        legacy_df = df.head(args.legacy_limit) if args.legacy_limit else df
+
+        legacy_count, legacy_time = timed(app, legacy_import, legacy_df)
+        bulk_count, bulk_time = timed(app, bulk_import, df, args.batch_size)
+
+        legacy_rate = legacy_count / legacy_time if legacy_time else 0
+        bulk_rate = bulk_count / bulk_time if bulk_time else 0
+        speedup = bulk_rate / legacy_rate if legacy_rate else float('inf')
+        print(f'{os.path.basename(path):<24}{len(df):>8}{legacy_rate:>16.0f}{bulk_rate:>16.0f}{speedup:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+导入读取阶段的内存基准：对比 pd.read_excel + to_dict 与 importer.read_rows 流式读取
+的峰值 RSS。每种方式在独立子进程中运行，流式读取再按不同行数各跑一次，
+用来验证峰值内存不随表格长度增长。
+
+用法：python benchmarks/bench_import_memory.py [--file data/hunan_museum.xlsx]
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import resource
+import sys
+
+from _common import ROOT
+
+
+def _rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _consume_pandas(path, limit, queue):
+    import pandas as pd
+    before = _rss_mb()
+    df = pd.read_excel(path)
+    rows = 0
+    for _ in itertools.islice(df.to_dict('records'), limit):
+        rows += 1
+    queue.put((rows, before, _rss_mb()))
+
+
+def _consume_stream(path, limit, queue):
+    sys.path.insert(0, ROOT)
+    from importer import read_rows
+    before = _rss_mb()
+    rows = 0
+    for _ in itertools.islice(read_rows(path), limit):
+        rows += 1
+    queue.put((rows, before, _rss_mb()))
+
+
+def measure(target, path, limit=None):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(path, limit, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--file', default=os.path.join(ROOT, 'data', 'hunan_museum.xlsx'))
+    args = parser.parse_args()
+
+    size_mb = os.path.getsize(args.file) / 1024 / 1024
+    print(f'{args.file} ({size_mb:.1f} MB)')
+    print(f'{"reader":<22}{"rows":>8}{"peak RSS MB":>14}{"growth MB":>12}')
+
+    rows, before, peak = measure(_consume_pandas, args.file)
+    print(f'{"pandas read_excel":<22}{rows:>8}{peak:>14.1f}{peak - before:>12.1f}')
+
+    for limit in (1000, 10000, None):
+        rows, before, peak = measure(_consume_stream, args.file, limit)
+        print(f'{"openpyxl read_only":<22}{rows:>8}{peak:>14.1f}{peak - before:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+全文搜索基准：生成大量随机文物，对比
+  like  直接在主库上 name/description LIKE '%词%'（逐行扫描）
+  fts   search.py 的 SQLite FTS5 索引（按相关度排序）
+输出建索引耗时，以及每种方式查询延迟的 p50 / p95（毫秒）。
+
+用法：python benchmarks/bench_search.py [--count 100000] [--queries 200]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _common import setup_app
+
+# 常见词：随机数据的字表很小，几乎每条文物都会命中，考验排序与分面统计
+COMMON_TERMS = ['青铜', '玉石', '瓷瓶', '金银', '书画', '铜鼎', '漆木', '丝帛', '青', '镜印佩']
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def measure(func, queries):
+    timings = []
+    for term, filters in queries:
+        start = time.perf_counter()
+        func(term, filters)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), percentile(timings, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    app = setup_app()
+    from models import db, Artifact, Museum, Category
+    from commands import seed_artifacts
+    from facets import apply_filters
+    from search import get_search_index
+
+    with app.app_context():
+        museum = Museum(name='benchmark')
+        db.session.add(museum)
+        db.session.commit()
+        start = time.perf_counter()
+        seed_artifacts(museum.id, args.count, seed=1)
+        print(f'seeded {args.count} artifacts in {time.perf_counter() - start:.1f}s')
+
+        index = get_search_index()
+        start = time.perf_counter()
+        total = index.rebuild()
+        print(f'indexed {total} documents in {time.perf_counter() - start:.1f}s')
+
+        rng = random.Random(0)
+        category_ids = [c.id for c in Category.query]
+        def make_queries(terms):
+            return [(rng.choice(terms), {'category': rng.choice(category_ids)} if rng.random() < 0.5 else {})
+                    for _ in range(args.queries)]
+
+        # 少见词：名称末尾的编号，只命中一两条，LIKE 必须扫描全表才能确定结果
+        workloads = {
+            'common': make_queries(COMMON_TERMS),
+            'selective': make_queries([str(rng.randrange(args.count)) for _ in range(50)]),
+        }
+
+        def like(term, filters):
+            pattern = f'%{term}%'
+            query = apply_filters(Artifact.query.filter_by(museum_id=museum.id), filters)
+            query = query.filter(db.or_(Artifact.name.like(pattern), Artifact.description.like(pattern)))
+            return [row.id for row in query.with_entities(Artifact.id).limit(1000)]
+
+        def fts(term, filters):
+            return index.search(term, museum_id=museum.id, filters=filters)
+
+        def fts_with_facets(term, filters):
+            index.search(term, museum_id=museum.id, filters=filters)
+            return index.facet_counts(term, museum_id=museum.id, filters=filters)
+
+        print(f'{"workload":<12}{"mode":<16}{"p50 ms":>10}{"p95 ms":>10}')
+        for workload, queries in workloads.items():
+            for name, func in (('like', like), ('fts', fts), ('fts+facets', fts_with_facets)):
+                func(*queries[0])  # 预热
+                p50, p95 = measure(func, queries)
+                print(f'{workload:<12}{name:<16}{p50:>10.2f}{p95:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
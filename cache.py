@@ -0,0 +1,393 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.utils import import_string
+
+from models import (
+    db, User, Artifact, Museum,
+    Category, Dynasty, MotifAndPattern, ObjectType, FormAndStructure
+)
+
+# ==============================
+# 进程内缓存（TTL + LRU，按标签失效）
+# ==============================
+
+_MISSING = object()
+
+
+class LocalCache:
+    """
+    默认的缓存后端：保存在当前进程内存中，线程安全。
+    超过 max_entries 时淘汰最久未使用的条目，超过 ttl 秒的条目视为过期。
+    每个条目可以带若干标签，invalidate(tag) 一次性删除带该标签的所有条目。
+
+    需要多进程共享缓存时，可实现同样的 get/set/invalidate/clear/stats 方法
+    （例如基于 Redis），再通过 CACHE_BACKEND 配置项替换本类。
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, 值, 标签)
+        self._tags = {}             # tag -> {key}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tags=(), ttl=None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, tag):
+        with self._lock:
+            for key in self._tags.pop(tag, ()):
+                if key in self._data:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': type(self).__name__,
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def init_cache(app):
+    backend = app.config.get('CACHE_BACKEND', 'cache.LocalCache')
+    if isinstance(backend, str):
+        backend = import_string(backend)
+    app.extensions['cache'] = backend(
+        max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+        ttl=app.config.get('CACHE_DEFAULT_TTL', 300)
+    )
+    museum_snapshot.ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+    user_cache.ttl = app.config.get('USER_CACHE_TTL', 60)
+    user_cache.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', 1024)
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def cached(key, loader, tags=(), ttl=None):
+    """读取缓存，未命中时调用 loader() 计算并写入"""
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        cache.set(key, value, tags=tags, ttl=ttl)
+    return value
+
+
+def invalidate_tags(tags):
+    cache = get_cache()
+    for tag in tags:
+        cache.invalidate(tag)
+    # 任一博物馆的文物变化、博物馆改名都会影响跨馆统计
+    if 'museums' in tags or any(tag.startswith('facets:') for tag in tags):
+        cache.invalidate('facets:all')
+    if 'museums' in tags:
+        museum_snapshot.invalidate()
+    for tag in tags:
+        if tag.startswith('user:'):
+            user_cache.invalidate(int(tag[len('user:'):]))
+    data_versions.bump(tags)
+
+
+# ==============================
+# 常用数据的缓存读取
+# ==============================
+
+# 缓存中只保存简单的元组，避免跨请求、跨线程共享 ORM 对象
+LabelRow = namedtuple('LabelRow', ['id', 'name'])
+
+LABEL_MODELS = (Category, Dynasty, MotifAndPattern, ObjectType, FormAndStructure)
+
+
+def label_rows(model):
+    """标签管理页的完整标签列表"""
+    return cached(
+        ('labels', model.__name__),
+        lambda: [LabelRow(*row) for row in db.session.query(model.id, model.name).order_by(model.id)],
+        tags=[f'labels:{model.__name__}']
+    )
+
+
+def cached_facet_counts(museum_id, filters):
+    """某博物馆的分面统计；museum_id 为 None 时为跨馆统计（多一个博物馆分面）"""
+    from facets import facet_counts, GLOBAL_FACETS
+    if museum_id is None:
+        return cached(
+            ('facets', None, tuple(sorted(filters.items()))),
+            lambda: facet_counts(None, filters, GLOBAL_FACETS),
+            tags=['facets', 'facets:all']
+        )
+    return cached(
+        ('facets', museum_id, tuple(sorted(filters.items()))),
+        lambda: facet_counts(museum_id, filters),
+        tags=['facets', f'facets:{museum_id}']
+    )
+
+
+def cached_museum_stats(museum_id=None):
+    """博物馆统计 {museum_id: MuseumStats}；museum_id 为 None 时为全部博物馆"""
+    from stats import compute_stats
+    tags = ['facets', 'facets:all' if museum_id is None else f'facets:{museum_id}']
+    return cached(('stats', museum_id), lambda: compute_stats(museum_id), tags=tags)
+
+
+class MuseumSnapshot:
+    """
+    导航栏博物馆列表的版本化快照。
+    博物馆新建、改名、删除时 invalidate() 把版本号加一，下次读取时才重新查询；
+    另设 ttl 作为兜底，使多进程部署下其他进程的修改最终也能生效。
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.version = 0
+        self.rebuilds = 0
+        self._rows = None
+        self._built_version = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def rows(self):
+        with self._lock:
+            fresh = (self._built_version == self.version
+                     and time.monotonic() - self._built_at < self.ttl)
+            if fresh:
+                return self._rows
+            version = self.version
+        rows = [LabelRow(*row) for row in db.session.query(Museum.id, Museum.name).order_by(Museum.name)]
+        with self._lock:
+            # 重建期间若版本又变化，则不标记为最新，下次读取再重建
+            self._rows = rows
+            self._built_version = version
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+        return rows
+
+
+museum_snapshot = MuseumSnapshot()
+
+
+class DataVersions:
+    """
+    文物列表页所依赖数据的版本号，invalidate_tags 时加一：
+      'facets:<id>'  该博物馆的文物        'facets:all'  任一博物馆的文物
+      'labels'       标签改名、删除、合并    'museums'     博物馆新建、改名、删除
+      'search'       搜索索引同步完成（在提交之后的后台任务中，见 search.SearchIndex.refresh）
+    列表页的 ETag 与渲染结果缓存的键都包含版本号，数据变化后旧的自然不再匹配，不需要逐个删除。
+    计数器只在本进程内有效；epoch 在进程启动时随机生成，使不同进程、重启前后的版本号不会混淆。
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, tags):
+        keys = set()
+        for tag in tags:
+            if tag.startswith('facets:'):
+                keys.update((tag, 'facets:all'))
+            elif tag == 'facets' or tag.startswith('labels:'):
+                keys.add('labels')
+            elif tag == 'museums':
+                keys.update(('museums', 'facets:all'))
+            elif tag == 'search':
+                keys.add('search')
+        if keys:
+            with self._lock:
+                for key in keys:
+                    self._versions[key] = self._versions.get(key, 0) + 1
+
+    def stamp(self, *keys):
+        """(epoch, 各版本号)"""
+        with self._lock:
+            return (self.epoch,) + tuple(self._versions.get(key, 0) for key in keys)
+
+    def stats(self):
+        with self._lock:
+            return {'epoch': self.epoch, 'versions': dict(self._versions)}
+
+
+data_versions = DataVersions()
+
+
+# 缓存中的登录用户：只保存列值，不保存 ORM 对象
+UserRow = namedtuple('UserRow', ['id', 'username', 'password_hash', 'role', 'auth_version'])
+
+
+class UserCache:
+    """
+    登录用户缓存：load_user 在每个已登录请求中都会调用，命中时只读取 user.auth_version 一列，不载入整行。
+    条目记下载入时的 auth_version，读取时与数据库中的当前值比对，不一致（用户在任一进程中被修改）
+    或用户已删除时视为失效，因此角色降级、删除在所有进程中立即生效。
+    本进程内的修改另外直接删除条目；超过 ttl 的条目重新载入，超过 max_entries 时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # user_id -> (过期时间, UserRow)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id, auth_version):
+        """auth_version 为数据库中的当前值"""
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None:
+                expires_at, row = entry
+                if row.auth_version == auth_version and expires_at >= time.monotonic():
+                    self._data.move_to_end(user_id)
+                    self.hits += 1
+                    return row
+                del self._data[user_id]
+            self.misses += 1
+            return None
+
+    def set(self, user_id, row):
+        with self._lock:
+            self._data[user_id] = (time.monotonic() + self.ttl, row)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+user_cache = UserCache()
+
+
+def load_cached_user(user_id):
+    """
+    供 login_manager.user_loader 使用。先读取 auth_version（按主键取一列），用户已删除时返回 None；
+    命中缓存时用缓存的列值构造 User，再 merge(load=False) 挂到当前会话，之后仍可像普通查询结果一样修改、提交。
+    """
+    auth_version = db.session.execute(select(User.auth_version).where(User.id == user_id)).scalar()
+    if auth_version is None:
+        return None
+    row = user_cache.get(user_id, auth_version)
+    if row is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(user_id, UserRow(user.id, user.username, user.password_hash, user.role,
+                                            user.auth_version))
+        return user
+    user = User(**row._asdict())
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def bump_user_versions(session):
+    """before_flush：被修改的用户 auth_version 加一（在 UPDATE 中计算，并发修改也不会丢失）"""
+    for instance in session.dirty:
+        if isinstance(instance, User) and session.is_modified(instance):
+            instance.auth_version = User.auth_version + 1
+
+
+def collect_tags(session):
+    """根据本次 flush 涉及的对象，算出需要失效的缓存标签"""
+    tags = set()
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Artifact):
+            tags.add(f'facets:{instance.museum_id}')
+            # 文物被移到其他博物馆时，原博物馆的分面也要失效
+            for old_museum_id in inspect(instance).attrs.museum_id.history.deleted:
+                tags.add(f'facets:{old_museum_id}')
+        elif isinstance(instance, LABEL_MODELS):
+            tags.add(f'labels:{type(instance).__name__}')
+            # 标签改名/删除会影响所有博物馆的分面名称
+            if instance not in session.new:
+                tags.add('facets')
+        elif isinstance(instance, User):
+            # 角色、密码修改或删除后，登录用户缓存立即失效
+            if instance not in session.new:
+                tags.add(f'user:{instance.id}')
+        elif isinstance(instance, Museum):
+            # 只有新建、改名、删除会影响导航栏
+            if instance in session.new or instance in session.deleted \
+                    or inspect(instance).attrs.name.history.has_changes():
+                tags.add('museums')
+    return tags
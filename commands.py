@@ -0,0 +1,314 @@
+import random
+from concurrent.futures import as_completed
+from collections import defaultdict
+
+import click
+from sqlalchemy import bindparam, func, insert, select, text, update
+
+from app import app
+from models import (
+    db, Artifact, Museum, label_hash,
+    Category, Dynasty, Image, MotifAndPattern, ObjectType, FormAndStructure
+)
+from audit import bulk_log
+from cache import invalidate_tags
+from retention import archive_logs
+from search import get_search_index
+from images import get_image_pipeline, prefetch_urls
+from facets import FACETS, artifact_query, facet_statement
+from stats import StatDelta, USAGE_KIND_OF, stats_statement, rebuild_stats, recompute, materialized, diff_stats
+from pagination import _seek_condition
+
+# ==============================
+# 命令行工具（flask <命令>）
+# ==============================
+
+
+@app.cli.command('explain-artifacts')
+@click.option('--museum-id', type=int, help='要分析的博物馆，默认取文物最多的一个')
+@click.option('--category', type=int, help='附加的类别筛选')
+@click.option('--dynasty', type=int, help='附加的朝代筛选')
+def explain_artifacts(museum_id, category, dynasty):
+    """对 /artifacts/<museum_id> 实际执行的查询运行 EXPLAIN，确认索引是否被使用"""
+    if museum_id is None:
+        museum_id = db.session.execute(
+            select(Artifact.museum_id).group_by(Artifact.museum_id)
+            .order_by(func.count().desc()).limit(1)
+        ).scalar()
+        if museum_id is None:
+            raise click.ClickException('数据库中还没有文物，可先运行 flask seed-artifacts')
+
+    filters = {k: v for k, v in (('category', category), ('dynasty', dynasty)) if v}
+    query = artifact_query(museum_id, filters)
+    columns = (Artifact.name, Artifact.id)
+
+    statements = [
+        ('列表第一页', query.order_by(*columns).limit(22).statement),
+    ]
+    # 取中间的一行作为游标，模拟翻到深页
+    middle = query.order_by(*columns).offset(query.count() // 2).first()
+    if middle is not None:
+        seek = _seek_condition(columns, [middle.name, middle.id], forward=True)
+        statements.append(('列表深页（键集）', query.filter(seek).order_by(*columns).limit(22).statement))
+    statements.append(('总数统计', select(func.count()).select_from(query.order_by(None).subquery())))
+    for key in FACETS:
+        statements.append((f'分面 {key}', facet_statement(museum_id, filters, key)))
+    # 跨馆浏览（/artifacts）
+    global_query = artifact_query(None, filters)
+    statements.append(('跨馆列表第一页', global_query.order_by(*columns).limit(22).statement))
+    statements.append(('跨馆分面 museum', facet_statement(None, filters, 'museum')))
+    # 博物馆管理页的统计
+    statements.append(('博物馆统计（全部）', stats_statement()))
+
+    dialect = db.engine.dialect
+    prefix = 'EXPLAIN QUERY PLAN' if dialect.name == 'sqlite' else 'EXPLAIN'
+    click.echo(f'数据库：{dialect.name}，博物馆 id={museum_id}，筛选={filters or "无"}')
+    for title, statement in statements:
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        click.echo(f'\n===== {title} =====\n{sql}\n----- 执行计划 -----')
+        result = db.session.execute(text(f'{prefix} {sql}'))
+        click.echo(' | '.join(result.keys()))
+        for row in result:
+            click.echo(' | '.join('' if v is None else str(v) for v in row))
+
+
+@app.cli.command('seed-artifacts')
+@click.argument('count', type=int)
+@click.option('--museum-name', default='演示博物馆', help='写入的博物馆（不存在则创建）')
+@click.option('--seed', type=int, default=0, help='随机数种子')
+def seed_artifacts_command(count, museum_name, seed):
+    """生成 COUNT 条随机文物，用于查看执行计划或做性能测试"""
+    museum = Museum.query.filter_by(name=museum_name).first()
+    if museum is None:
+        museum = Museum(name=museum_name)
+        db.session.add(museum)
+        db.session.commit()
+    seed_artifacts(museum.id, count, seed=seed)
+    click.echo(f'已为【{museum_name}】生成 {count} 条文物')
+
+
+def seed_artifacts(museum_id, count, seed=0, batch_size=5000):
+    """批量生成随机文物（同时补齐各类标签），不经过 ORM 钩子"""
+    rng = random.Random(seed)
+    label_ids = {}
+    for model, prefix, size in ((Category, '类别', 20), (Dynasty, '朝代', 15), (MotifAndPattern, '纹饰', 60),
+                                (ObjectType, '器型', 40), (FormAndStructure, '形制', 30)):
+        names = [f'{prefix}{i}' for i in range(size)]
+        existing = dict(db.session.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+        missing = [n for n in names if n not in existing]
+        if missing:
+            rows = [{'name': n} for n in missing]
+            if hasattr(model, 'name_hash'):
+                for row in rows:
+                    row['name_hash'] = label_hash(row['name'])
+            db.session.execute(insert(model), rows)
+            existing = dict(db.session.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+        label_ids[model] = list(existing.values())
+
+    words = '青铜玉石瓷陶金银漆木竹丝帛书画鼎壶尊盘杯碗瓶罐镜印佩簪'
+    for start in range(0, count, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, count)):
+            rows.append({
+                'museum_id': museum_id,
+                'name': ''.join(rng.choices(words, k=rng.randint(3, 8))) + f'{i}',
+                'description': ''.join(rng.choices(words, k=rng.randint(10, 60))),
+                'category_id': rng.choice(label_ids[Category]),
+                'dynasty_id': rng.choice(label_ids[Dynasty]),
+                'motif_id': rng.choice(label_ids[MotifAndPattern]) if rng.random() < 0.7 else None,
+                'object_type_id': rng.choice(label_ids[ObjectType]) if rng.random() < 0.7 else None,
+                'form_structure_id': rng.choice(label_ids[FormAndStructure]) if rng.random() < 0.5 else None,
+            })
+        db.session.execute(insert(Artifact), rows)
+        StatDelta().add_rows(rows).apply()
+        db.session.commit()
+    # 批量 INSERT 不经过 flush 钩子，整馆登记为待更新搜索索引
+    get_search_index().mark_dirty(museum_ids=[museum_id])
+
+
+# 带摘要唯一索引的标签表：(模型, 原始值字段, 摘要字段, Artifact 外键字段)
+HASHED_LABELS = (
+    (MotifAndPattern, 'name', 'name_hash', 'motif_id'),
+    (ObjectType, 'name', 'name_hash', 'object_type_id'),
+    (FormAndStructure, 'name', 'name_hash', 'form_structure_id'),
+    (Image, 'url', 'url_hash', 'image_id'),
+)
+
+
+@app.cli.command('rehash-labels')
+def rehash_labels():
+    """
+    回填标签表的摘要列，并合并重复记录（在 flask db upgrade 添加摘要列之后运行一次）。
+    重复记录保留 id 最小的一条，文物上的外键批量改指向它，其余删除。
+    """
+    for model, attr, hash_attr, fk in HASHED_LABELS:
+        table = model.__table__
+        groups = defaultdict(list)   # 摘要 -> [(id, 当前摘要)]
+        for record_id, value, current in db.session.execute(
+                select(model.id, getattr(model, attr), getattr(model, hash_attr)).order_by(model.id)):
+            groups[model.digest(value)].append((record_id, current))
+
+        merged, usage = _merge_duplicates(
+            model, fk, [[record_id for record_id, _ in records] for records in groups.values()]
+        )
+
+        # 重复记录删除后再写摘要，避免违反唯一约束
+        changes = [{'_id': records[0][0], '_hash': digest}
+                   for digest, records in groups.items() if records[0][1] != digest]
+        if changes:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('_id')).values({hash_attr: bindparam('_hash')}),
+                changes
+            )
+        if merged:
+            usage.apply()
+            bulk_log(model.__name__, 'bulk_merge', merged)
+        db.session.commit()
+        click.echo(f'{model.__name__}: 回填 {len(changes)} 条摘要，合并 {merged} 条重复记录')
+
+
+def _merge_duplicates(model, fk, groups):
+    """
+    合并重复的标签记录：groups 为若干组 id（按 id 升序），每组保留第一条，
+    文物上的外键批量改指向它，其余删除。不提交，返回 (删除的记录数, 使用次数的 StatDelta)。
+    """
+    table = model.__table__
+    column = getattr(Artifact, fk)
+    kind = USAGE_KIND_OF[model]
+    merged = 0
+    usage = StatDelta()
+    for ids in groups:
+        keep_id, duplicate_ids = ids[0], ids[1:]
+        if not duplicate_ids:
+            continue
+        # 重复记录的使用次数转到保留的记录上
+        for duplicate_id, used in db.session.execute(
+                select(column, func.count()).where(column.in_(duplicate_ids)).group_by(column)):
+            usage.labels[(kind, duplicate_id)] -= used
+            usage.labels[(kind, keep_id)] += used
+        db.session.execute(update(Artifact).where(column.in_(duplicate_ids)).values({fk: keep_id}))
+        db.session.execute(table.delete().where(table.c.id.in_(duplicate_ids)))
+        merged += len(duplicate_ids)
+    return merged, usage
+
+
+@app.cli.command('logs-archive')
+@click.option('--days', type=int, help='归档多少天以前的日志，默认取 LOG_RETENTION_DAYS')
+@click.option('--batch-size', type=int, help='每批归档/删除的行数，默认取 LOG_ARCHIVE_BATCH_SIZE')
+def logs_archive(days, batch_size):
+    """把过期日志移入压缩归档文件，并分批从 log 表删除"""
+    total = archive_logs(
+        app.config['LOG_ARCHIVE_DIR'],
+        days if days is not None else app.config['LOG_RETENTION_DAYS'],
+        batch_size=batch_size or app.config['LOG_ARCHIVE_BATCH_SIZE'],
+        on_progress=lambda n: click.echo(f'已归档 {n} 条')
+    )
+    click.echo(f'完成，共归档 {total} 条日志到 {app.config["LOG_ARCHIVE_DIR"]}')
+
+
+@app.cli.command('search-reindex')
+def search_reindex():
+    """从数据库全量重建全文搜索索引"""
+    total = get_search_index().rebuild()
+    click.echo(f'完成，共索引 {total} 件文物到 {app.config["SEARCH_INDEX_PATH"]}')
+
+
+STAT_TABLES = {'artifact': 'ArtifactStat', 'label_usage': 'LabelUsageStat', 'activity': 'ActivityStat'}
+
+
+@app.cli.command('stats-rebuild')
+def stats_rebuild():
+    """从 artifact / log 表全量重算统计汇总表（首次部署或 stats-verify 发现不一致时运行）"""
+    counts = rebuild_stats(app.config['LOG_ARCHIVE_DIR'])
+    for name, count in counts.items():
+        click.echo(f'{STAT_TABLES[name]}: {count} 行')
+
+
+@app.cli.command('stats-verify')
+@click.option('--limit', default=20, help='最多列出多少条不一致')
+def stats_verify(limit):
+    """把增量维护的统计汇总表与从头重算的结果逐行比较，不一致时以非零状态退出"""
+    expected, since = recompute(app.config['LOG_ARCHIVE_DIR'])
+    mismatches = diff_stats(expected, materialized(since))
+    for name, key, want, got in mismatches[:limit]:
+        click.echo(f'{STAT_TABLES[name]} {key}: 应为 {want}，实际 {got}')
+    if mismatches:
+        raise click.ClickException(f'共 {len(mismatches)} 处不一致，可运行 flask stats-rebuild 修复')
+    click.echo('统计汇总表与原始数据一致' + (f'（操作量自 {since} 起核对）' if since else ''))
+
+
+@app.cli.command('images-prefetch')
+@click.option('--museum-id', type=int, help='只预取该博物馆的图片，默认全部')
+def images_prefetch(museum_id):
+    """下载尚未缓存的文物图片并生成缩略图（部署后对已有数据运行一次）"""
+    pipeline = get_image_pipeline()
+    urls = prefetch_urls(pipeline.store, museum_id)
+    failed = 0
+    for done, future in enumerate(as_completed([pipeline.submit(url) for url in urls]), 1):
+        entry = future.result()
+        if 'digest' not in entry:
+            failed += 1
+            click.echo(f'失败：{entry["url"]}（{entry["error"]}）')
+        if done % 100 == 0:
+            click.echo(f'已处理 {done} / {len(urls)}')
+    click.echo(f'完成，共处理 {len(urls)} 张图片，失败 {failed} 张，缓存目录 {app.config["IMAGE_STORE_DIR"]}')
+
+
+@app.cli.command('images-dedupe')
+@click.option('--dry-run', is_flag=True, help='只统计，不修改数据库')
+def images_dedupe(dry_run):
+    """
+    合并重复的图片记录（在 flask db upgrade 添加 content_hash 列之后运行，之前先运行 images-prefetch）：
+    规范化 URL 相同，或已下载的内容相同的记录保留 id 最小的一条，文物的 image_id 批量改指向它，其余删除；
+    同时回填 content_hash，并把 url_hash 改为规范化 URL 的摘要。
+    """
+    store = get_image_pipeline().store
+    table = Image.__table__
+    records = {}                  # id -> [规范化摘要, 当前 url_hash, 内容摘要, 当前 content_hash]
+    by_url = defaultdict(list)    # 规范化摘要 -> [id]
+    for record_id, url, current, stored in db.session.execute(
+            select(Image.id, Image.url, Image.url_hash, Image.content_hash).order_by(Image.id)):
+        content = stored
+        if content is None:
+            entry = store.entry(url)
+            content = entry['digest'] if store.is_usable(entry) else None
+        records[record_id] = [Image.digest(url), current, content, stored]
+        by_url[records[record_id][0]].append(record_id)
+
+    # 先按 URL 合并，再把每组的保留记录按内容合并（一组中取第一个已知的内容摘要）
+    by_content = defaultdict(list)   # 内容摘要 -> [保留记录 id]
+    survivors = []
+    for ids in by_url.values():
+        content = next((records[i][2] for i in ids if records[i][2]), None)
+        records[ids[0]][2] = content
+        if content is None:
+            survivors.append(ids)
+        else:
+            by_content[content].append(ids)
+    for groups in by_content.values():
+        survivors.append(sorted(i for ids in groups for i in ids))
+
+    duplicates = sum(len(ids) - 1 for ids in survivors)
+    if dry_run:
+        click.echo(f'共 {len(records)} 条图片记录，可合并 {duplicates} 条重复记录')
+        return
+
+    merged, usage = _merge_duplicates(Image, 'image_id', survivors)
+    # 重复记录删除后再写摘要，避免违反唯一约束
+    changes = []
+    for ids in survivors:
+        digest, current, content, stored = records[ids[0]]
+        if current != digest or content != stored:
+            changes.append({'_id': ids[0], '_hash': digest, '_content': content})
+    if changes:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('_id'))
+            .values(url_hash=bindparam('_hash'), content_hash=bindparam('_content')),
+            changes
+        )
+    if merged:
+        usage.apply()
+        bulk_log('Image', 'bulk_merge', merged)
+    db.session.commit()
+    invalidate_tags({'labels:Image'})
+    click.echo(f'完成，共 {len(records)} 条图片记录，合并 {merged} 条重复记录，更新 {len(changes)} 条摘要')
@@ -6,4 +6,34 @@ load_dotenv()  # 从.env加载变量
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')  # 用于session和表单安全
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')  # MySQL连接
-    SQLALCHEMY_TRACK_MODIFICATIONS = False  # 优化性能
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False  # 优化性能
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))  # 批量导入每批行数
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))  # 后台任务线程数（可同时进行的导入数量）
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'cache.LocalCache')  # 缓存后端（可替换为共享缓存）
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))  # 缓存过期时间（秒）
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))  # 缓存条目上限（LRU 淘汰）
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # 登录用户缓存过期时间（秒）；修改、删除通过 user.auth_version 立即生效
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 1024))  # 登录用户缓存条目上限
+    ARTIFACT_PAGINATION = os.getenv('ARTIFACT_PAGINATION', 'keyset')  # 文物列表分页方式：keyset / offset
+    ARTIFACT_COUNT_MODE = os.getenv('ARTIFACT_COUNT_MODE', 'exact')  # 总数统计：exact / approx / none
+    ARTIFACT_ETAG_TTL = int(os.getenv('ARTIFACT_ETAG_TTL', 300))  # 文物列表 ETag 的最长有效期（秒），0 为不使用 ETag
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', 'instance/jinja')  # 模板字节码缓存目录，留空为不缓存
+    TEMPLATE_PRECOMPILE = int(os.getenv('TEMPLATE_PRECOMPILE', 1))  # 启动时预编译全部模板，0 为关闭
+    ARTIFACT_FRAGMENT_TTL = int(os.getenv('ARTIFACT_FRAGMENT_TTL', 0))  # 文物列表渲染结果缓存（秒，同角色共享），0 为关闭
+    LOG_ARCHIVE_DIR = os.getenv('LOG_ARCHIVE_DIR', 'archive/logs')  # 日志归档目录
+    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 180))  # 日志表只保留最近多少天
+    LOG_ARCHIVE_BATCH_SIZE = int(os.getenv('LOG_ARCHIVE_BATCH_SIZE', 5000))  # 每批归档/删除的行数
+    LOG_RETENTION_INTERVAL = float(os.getenv('LOG_RETENTION_INTERVAL', 0))  # 定时归档间隔（小时），0 为关闭
+    SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'search/artifacts.db')  # 全文搜索索引文件（SQLite FTS5）
+    API_DEFAULT_PAGE_SIZE = int(os.getenv('API_DEFAULT_PAGE_SIZE', 100))  # JSON API 默认每页条数
+    API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 1000))  # JSON API 每页/批量 ids 上限
+    API_COMPRESS_MIN_SIZE = int(os.getenv('API_COMPRESS_MIN_SIZE', 1024))  # 超过多少字节的响应才压缩
+    API_BATCH_MAX_OPS = int(os.getenv('API_BATCH_MAX_OPS', 1000))  # 批量写入接口每批最多操作数
+    IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', 'media/images')  # 图片缓存目录（原图与缩略图，按内容摘要存放）
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 4))  # 下载图片、生成缩略图的线程数
+    IMAGE_FETCH_TIMEOUT = int(os.getenv('IMAGE_FETCH_TIMEOUT', 10))  # 下载远程图片的超时（秒）
+    IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 20 * 1024 * 1024))  # 单张图片大小上限
+    IMAGE_RETRY_AFTER = int(os.getenv('IMAGE_RETRY_AFTER', 3600))  # 下载失败后多久再重试（秒）
+    IMAGE_FETCHER = os.getenv('IMAGE_FETCHER', 'images.fetch_url')  # 下载函数（可替换为本地实现，需接受 timeout、max_bytes、allowed_hosts 参数）
+    IMAGE_ALLOWED_HOSTS = [h.strip() for h in os.getenv('IMAGE_ALLOWED_HOSTS', '').split(',') if h.strip()]  # 允许下载的内网图片主机（逗号分隔），其他主机只能是公网地址
+    MUSEUM_DELETE_BATCH_SIZE = int(os.getenv('MUSEUM_DELETE_BATCH_SIZE', 1000))  # 强制删除博物馆时每批删除的文物数
@@ -0,0 +1,84 @@
+from collections import namedtuple
+
+from sqlalchemy import func, select
+
+from models import (
+    db, Artifact, Museum,
+    Category, Dynasty, MotifAndPattern, ObjectType, FormAndStructure
+)
+
+# ==============================
+# 文物筛选与分面统计
+# ==============================
+
+# 筛选参数名 -> (标签模型, Artifact 外键字段)
+FACETS = {
+    'category': (Category, 'category_id'),
+    'dynasty': (Dynasty, 'dynasty_id'),
+    'motif': (MotifAndPattern, 'motif_id'),
+    'object_type': (ObjectType, 'object_type_id'),
+    'form_structure': (FormAndStructure, 'form_structure_id'),
+}
+
+# 跨馆浏览时多一个“博物馆”分面
+GLOBAL_FACETS = dict(FACETS, museum=(Museum, 'museum_id'))
+
+# 筛选下拉框中的一项：标签 id、名称、当前条件下的文物数量
+FacetValue = namedtuple('FacetValue', ['id', 'name', 'count'])
+
+
+def parse_filters(args, facets=FACETS):
+    """从请求参数中取出有效的筛选条件，如 {'category': 3, 'dynasty': 5}"""
+    filters = {}
+    for key in facets:
+        value = args.get(key, type=int)
+        if value:
+            filters[key] = value
+    return filters
+
+
+def artifact_query(museum_id, filters):
+    """某博物馆（museum_id 为 None 时为全部博物馆）文物列表的基础查询（已应用筛选，未排序、未分页）"""
+    query = Artifact.query
+    if museum_id is not None:
+        query = query.filter_by(museum_id=museum_id)
+    return apply_filters(query, filters)
+
+
+def apply_filters(query, filters, exclude=None):
+    """给查询加上筛选条件，exclude 指定的分面不参与筛选"""
+    for key, value in filters.items():
+        if key != exclude:
+            query = query.filter(getattr(Artifact, GLOBAL_FACETS[key][1]) == value)
+    return query
+
+
+def facet_counts(museum_id, filters, facets=FACETS):
+    """
+    计算每个分面下拉框的可选值及数量。
+    每个分面一条 GROUP BY 查询：先在 artifact 表上按外键分组计数，
+    再关联标签表取名称，只返回 id/名称/数量，不加载文物对象。
+    计算某个分面时忽略它自身的筛选条件，这样切换选项时仍能看到其他值。
+    museum_id 为 None 时统计全部博物馆（此时 facets 通常传 GLOBAL_FACETS）。
+    """
+    result = {}
+    for key in facets:
+        rows = db.session.execute(facet_statement(museum_id, filters, key))
+        result[key] = [FacetValue(*row) for row in rows]
+    return result
+
+
+def facet_statement(museum_id, filters, key):
+    """单个分面的统计 SQL（也供 flask explain-artifacts 查看执行计划）"""
+    model, fk = GLOBAL_FACETS[key]
+    column = getattr(Artifact, fk)
+    counts = select(column.label('label_id'), func.count().label('total')).where(column.isnot(None))
+    if museum_id is not None:
+        counts = counts.where(Artifact.museum_id == museum_id)
+    counts = apply_filters(counts, filters, exclude=key) \
+        .group_by(column) \
+        .subquery()
+
+    return select(model.id, model.name, counts.c.total) \
+        .join(counts, counts.c.label_id == model.id) \
+        .order_by(model.name)
@@ -48,7 +48,7 @@ class ImportForm(FlaskForm):
     )
     new_museum_name = StringField('新博物馆名称', validators=[Optional()])
 
-    file = FileField('上传 Excel 文件（可选）', validators=[Optional()])
+    file = FileField('上传 Excel 或 CSV 文件（可选）', validators=[Optional()])
     submit = SubmitField('开始导入')
 
     def __init__(self, *args, **kwargs):
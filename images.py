@@ -0,0 +1,354 @@
+import functools
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from urllib.request import (
+    Request, build_opener, HTTPHandler, HTTPSHandler, HTTPRedirectHandler, ProxyHandler
+)
+
+from flask import current_app
+from werkzeug.utils import import_string
+
+from sqlalchemy import bindparam, update
+
+from models import db, url_digest, Artifact, Image
+
+try:
+    from PIL import Image as PILImage, ImageOps  # 可选依赖：安装后生成缩略图与 WebP
+except ImportError:
+    PILImage = None
+
+# ==============================
+# 图片缓存与缩略图
+# ==============================
+#
+# 远程图片只下载一次，按内容的 SHA-256 存入本地目录（内容寻址，相同内容只存一份）：
+#   originals/ab/<摘要>                 原图
+#   derived/ab/<摘要>/thumb.jpg 等      缩略图（JPEG 与 WebP 各一份）
+#   urls/ab/<url_hash>.json             规范化 URL -> 内容摘要与可用的派生文件（或最近一次失败原因）
+# 下载与生成缩略图在线程池中进行，页面请求不等待；未生成前 /images/<id>/<variant> 临时跳转到原图。
+# 下载完成后把内容摘要写入 Image.content_hash，flask images-dedupe 据此合并内容相同的记录。
+# 未安装 Pillow 时不生成缩略图，各尺寸都直接使用缓存的原图。
+# 原图与本站同源提供，只接受 Content-Type 为图片的响应（SVG 可内嵌脚本，不接受），
+# 其他类型（例如出错时返回的 HTML 页面）记为下载失败。
+# 图片地址来自导入的表格，导入后自动预取：下载时只连接公网地址（回环、内网、链路本地如
+# 169.254.169.254 云主机元数据等一律拒绝），重定向后的地址同样检查；
+# 内网图片服务器需在 IMAGE_ALLOWED_HOSTS 中列出主机名。
+
+# 派生尺寸：名称 -> 最大宽高
+VARIANTS = {
+    'thumb': (480, 480),     # 文物列表卡片
+    'medium': (1200, 1200),  # 大图预览
+}
+
+# 输出格式：名称 -> (MIME 类型, 扩展名, 保存参数)
+FORMATS = {
+    'webp': ('image/webp', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('image/jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def is_image_type(content_type):
+    """可以同源提供的原图类型：image/*，SVG 除外"""
+    content_type = (content_type or '').lower()
+    return content_type.startswith('image/') and not content_type.startswith('image/svg')
+
+
+def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, allowed_hosts=()):
+    """
+    代替 socket.create_connection：解析主机名后检查全部地址，只连接公网地址。
+    连接的正是检查过的地址，解析结果在检查与连接之间变化也无法绕过。
+    """
+    host, port = address
+    addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    if host.lower() not in allowed_hosts:
+        for *_, sockaddr in addresses:
+            ip = ipaddress.ip_address(sockaddr[0].split('%')[0])
+            if not ip.is_global or ip.is_multicast:
+                raise ValueError(f'不允许访问内网地址：{host}（{ip}）')
+    error = None
+    for family, type_, proto, _, sockaddr in addresses:
+        sock = socket.socket(family, type_, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error
+
+
+class _GuardedOpen:
+    """HTTP(S)Handler 的混入：每次建立连接（包括重定向后的请求）都经过 _connect_public"""
+    allowed_hosts = ()
+
+    def do_open(self, http_class, req, **kwargs):
+        def connection(host, **options):
+            conn = http_class(host, **options)
+            conn._create_connection = functools.partial(_connect_public, allowed_hosts=self.allowed_hosts)
+            return conn
+        return super().do_open(connection, req, **kwargs)
+
+
+class _GuardedHTTPHandler(_GuardedOpen, HTTPHandler):
+    pass
+
+
+class _GuardedHTTPSHandler(_GuardedOpen, HTTPSHandler):
+    pass
+
+
+class _RedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        # 默认还允许跳转到 ftp，ftp 连接不经过地址检查
+        if urlsplit(newurl).scheme not in ('http', 'https'):
+            raise ValueError(f'不支持的重定向地址：{newurl}')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def fetch_url(url, timeout=10, max_bytes=20 * 1024 * 1024, allowed_hosts=()):
+    """下载远程图片，返回 (内容, Content-Type)；只允许 http/https 与公网地址（allowed_hosts 中的主机除外）"""
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise ValueError(f'不支持的图片地址：{url}')
+    handlers = [_GuardedHTTPHandler(), _GuardedHTTPSHandler()]
+    for handler in handlers:
+        handler.allowed_hosts = {host.lower() for host in allowed_hosts}
+    # 不走环境变量中的代理：经代理时实际连接的是代理，无法检查目标地址
+    opener = build_opener(ProxyHandler({}), *handlers, _RedirectHandler)
+    request = Request(url, headers={'User-Agent': 'museum-artifacts/1.0'})
+    with opener.open(request, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+        content_type = response.headers.get_content_type()
+    if len(data) > max_bytes:
+        raise ValueError(f'图片超过 {max_bytes} 字节')
+    return data, content_type
+
+
+class ImageStore:
+    """本地图片仓库：下载、按内容摘要存储、生成派生文件，全部操作只涉及文件系统"""
+
+    def __init__(self, root, fetcher=fetch_url, timeout=10, max_bytes=20 * 1024 * 1024, retry_after=3600,
+                 allowed_hosts=()):
+        self.root = root
+        self.fetcher = fetcher
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+
+    # ---------- 读取 ----------
+
+    def entry(self, url):
+        """URL 对应的记录；从未下载过时返回 None"""
+        try:
+            with open(self._entry_path(url_digest(url)), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def is_usable(entry):
+        """已下载且原图是图片（早期版本可能缓存过非图片内容，视同未下载）"""
+        return entry is not None and 'digest' in entry and is_image_type(entry.get('content_type'))
+
+    def is_ready(self, url):
+        return self.is_usable(self.entry(url))
+
+    def needs_fetch(self, url):
+        """未下载过，或上次失败已超过 retry_after 秒"""
+        entry = self.entry(url)
+        if entry is None:
+            return True
+        if 'digest' in entry:
+            return not self.is_usable(entry)
+        return time.time() - entry.get('failed_at', 0) >= self.retry_after
+
+    def variant(self, entry, name, accept_webp=False):
+        """返回 (文件路径, MIME 类型, ETag)；没有该尺寸的派生文件时回退到原图。entry 须满足 is_usable"""
+        if not self.is_usable(entry):
+            raise ValueError(f'图片尚未缓存：{entry.get("url") if entry else None}')
+        digest = entry['digest']
+        formats = entry.get('variants', {}).get(name, [])
+        for fmt in (['webp'] if accept_webp else []) + ['jpeg']:
+            if fmt in formats:
+                mimetype, ext, _ = FORMATS[fmt]
+                return self._derived_path(digest, f'{name}.{ext}'), mimetype, f'{digest}-{name}.{ext}'
+        return self._original_path(digest), entry['content_type'], digest
+
+    # ---------- 下载与生成 ----------
+
+    def ensure(self, url):
+        """下载（如尚未下载）并生成派生文件，返回 URL 对应的记录；失败时记录原因，不抛出异常"""
+        entry = self.entry(url)
+        if self.is_usable(entry):
+            return entry
+        try:
+            data, content_type = self.fetcher(url, timeout=self.timeout, max_bytes=self.max_bytes,
+                                              allowed_hosts=self.allowed_hosts)
+            if not is_image_type(content_type):
+                raise ValueError(f'不是图片：{content_type}')
+            digest = hashlib.sha256(data).hexdigest()
+            original = self._original_path(digest)
+            if not os.path.exists(original):
+                _write_atomic(original, data)
+            entry = {'url': url, 'digest': digest, 'content_type': content_type,
+                     'size': len(data), 'variants': self._derive(digest, data), 'fetched_at': time.time()}
+        except Exception as e:
+            entry = {'url': url, 'error': str(e), 'failed_at': time.time()}
+        _write_atomic(self._entry_path(url_digest(url)), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        return entry
+
+    def _derive(self, digest, data):
+        """生成各尺寸的 JPEG/WebP，返回 {尺寸: [格式]}；相同内容的派生文件已存在时直接复用"""
+        if PILImage is None:
+            return {}
+        variants = {}
+        for name, size in VARIANTS.items():
+            formats = [fmt for fmt, (_, ext, _) in FORMATS.items()
+                       if os.path.exists(self._derived_path(digest, f'{name}.{ext}'))]
+            if len(formats) < len(FORMATS):
+                formats = self._render(digest, data, name, size)
+            variants[name] = formats
+        return variants
+
+    def _render(self, digest, data, name, size):
+        with PILImage.open(BytesIO(data)) as image:
+            image.draft('RGB', size)   # JPEG 解码时直接按接近目标的尺寸缩小，省时省内存
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(size)
+            if image.mode not in ('RGB', 'L'):
+                # 透明背景铺白色，JPEG 不支持 alpha
+                background = PILImage.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+                image = background
+            formats = []
+            for fmt, (_, ext, options) in FORMATS.items():
+                buffer = BytesIO()
+                try:
+                    image.save(buffer, fmt.upper(), **options)
+                except (KeyError, OSError):
+                    continue   # Pillow 未编译 WebP 支持时跳过
+                _write_atomic(self._derived_path(digest, f'{name}.{ext}'), buffer.getvalue())
+                formats.append(fmt)
+        return formats
+
+    # ---------- 路径 ----------
+
+    def _original_path(self, digest):
+        return os.path.join(self.root, 'originals', digest[:2], digest)
+
+    def _derived_path(self, digest, filename):
+        return os.path.join(self.root, 'derived', digest[:2], digest, filename)
+
+    def _entry_path(self, url_hash):
+        return os.path.join(self.root, 'urls', url_hash[:2], f'{url_hash}.json')
+
+
+def _write_atomic(path, data):
+    """先写临时文件再改名，读取方不会看到写了一半的文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ImagePipeline:
+    """在线程池中执行 ImageStore.ensure；同一 URL 同时只处理一次。给出 app 时下载完成后回写 content_hash"""
+
+    def __init__(self, store, workers=4, app=None):
+        self.store = store
+        self.workers = workers
+        self.app = app
+        self._executor = None
+        self._running = {}   # url -> Future
+        self._lock = threading.Lock()
+
+    def submit(self, url):
+        with self._lock:
+            future = self._running.get(url)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image')
+                future = self._executor.submit(self._fetch, url)
+                self._running[url] = future
+            else:
+                return future
+        # 在锁外登记回调：future 已经完成时回调会在当前线程立即执行
+        future.add_done_callback(lambda _: self._done(url, future))
+        return future
+
+    def _fetch(self, url):
+        entry = self.store.ensure(url)
+        if self.app is not None and 'digest' in entry:
+            with self.app.app_context():
+                try:
+                    record_content_hashes([entry])
+                    db.session.commit()
+                except Exception:
+                    # 回写失败不影响缩略图，images-dedupe 会从缓存目录补齐
+                    db.session.rollback()
+                    self.app.logger.exception('写入图片内容摘要失败：%s', url)
+        return entry
+
+    def _done(self, url, future):
+        with self._lock:
+            if self._running.get(url) is future:
+                del self._running[url]
+
+
+def record_content_hashes(entries):
+    """把下载得到的内容摘要写入 Image.content_hash（按规范化 URL 匹配），不提交"""
+    rows = [{'_hash': url_digest(entry['url']), '_content': entry['digest']}
+            for entry in entries if 'digest' in entry]
+    if rows:
+        table = Image.__table__
+        db.session.execute(
+            update(table).where(table.c.url_hash == bindparam('_hash')).values(content_hash=bindparam('_content')),
+            rows
+        )
+
+
+def prefetch_urls(store, museum_id=None):
+    """博物馆（为空时为全部）文物引用的图片中，需要下载的 URL"""
+    image_ids = db.session.query(Artifact.image_id).filter(Artifact.image_id.isnot(None))
+    if museum_id is not None:
+        image_ids = image_ids.filter(Artifact.museum_id == museum_id)
+    query = db.session.query(Image.url).filter(Image.id.in_(image_ids))
+    return [url for url, in query if store.needs_fetch(url)]
+
+
+def init_images(app):
+    fetcher = app.config.get('IMAGE_FETCHER', 'images.fetch_url')
+    if isinstance(fetcher, str):
+        fetcher = import_string(fetcher)
+    store = ImageStore(
+        app.config.get('IMAGE_STORE_DIR', 'media/images'),
+        fetcher=fetcher,
+        timeout=app.config.get('IMAGE_FETCH_TIMEOUT', 10),
+        max_bytes=app.config.get('IMAGE_MAX_BYTES', 20 * 1024 * 1024),
+        retry_after=app.config.get('IMAGE_RETRY_AFTER', 3600),
+        allowed_hosts=app.config.get('IMAGE_ALLOWED_HOSTS', ())
+    )
+    app.extensions['images'] = ImagePipeline(store, workers=app.config.get('IMAGE_WORKERS', 4), app=app)
+
+
+def get_image_pipeline():
+    return current_app.extensions['images']
@@ -0,0 +1,194 @@
+import csv
+import math
+
+from openpyxl import load_workbook
+from sqlalchemy import insert
+
+from audit import bulk_log
+from cache import invalidate_tags
+from labels import LabelResolver, LABEL_COLUMNS, DEFAULT_LABELS
+from search import get_search_index
+from stats import StatDelta
+from models import db, Artifact
+
+# ==============================
+# 批量导入引擎
+# ==============================
+
+def _clean(value):
+    """把 Excel 单元格的值统一成去掉首尾空白的字符串，空值返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+# ==============================
+# 流式读取（内存占用与表格行数无关）
+# ==============================
+
+def count_rows(file_path):
+    """估计数据行数（不含表头），用于显示进度；无法快速得到时返回 None"""
+    if file_path.lower().endswith('.csv'):
+        return None
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        max_row = wb.active.max_row
+        return max_row - 1 if max_row else None
+    finally:
+        wb.close()
+
+
+def read_rows(file_path):
+    """
+    逐行读取 Excel(.xlsx) 或 CSV，每次只产出一行 表头->值 的字典。
+    Excel 使用 openpyxl 的 read_only 模式按行解析，不会把整张表读进内存。
+    """
+    if file_path.lower().endswith('.csv'):
+        yield from _read_csv(file_path)
+    else:
+        yield from _read_xlsx(file_path)
+
+
+def _read_xlsx(file_path):
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else None for h in header]
+        for values in rows:
+            # 跳过表格末尾的空行
+            if all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def _read_csv(file_path):
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+class BulkImporter:
+    """
+    按批导入文物：
+    1. 收集一批数据中每一列出现的不同标签值；
+    2. 用 LabelResolver（少量 IN 查询 + 批量 INSERT）解析/创建标签，缓存 名称->id；
+    3. 用 executemany 一次插入整批文物。
+    """
+
+    def __init__(self, museum_id, user_id=None, batch_size=500, on_progress=None):
+        self.museum_id = museum_id
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.on_progress = on_progress  # 每批结束后回调 on_progress(importer)
+        self.labels = LabelResolver(user_id)
+        self.imported = 0
+        self.failed = 0
+        self.errors = []  # [(行号, 错误信息)]
+        self._row_number = 0
+
+    def run(self, rows):
+        """导入可迭代的行（每行是 列名->值 的字典），返回成功条数"""
+        batch = []
+        try:
+            for row in rows:
+                self._row_number += 1
+                batch.append((self._row_number, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch)
+                    batch = []
+            if batch:
+                self._import_batch(batch)
+        finally:
+            # 批量 INSERT 不经过 flush 钩子；导入结束（或中途出错）后整馆登记为待更新搜索索引
+            if self.imported:
+                get_search_index().mark_dirty(museum_ids=[self.museum_id])
+        return self.imported
+
+    @property
+    def processed(self):
+        return self.imported + self.failed
+
+    # ---------- 内部实现 ----------
+
+    def _import_batch(self, batch):
+        self._import_records(batch)
+        # 批量 INSERT 不经过 ORM 的 flush 钩子，需要手动失效缓存
+        invalidate_tags({f'facets:{self.museum_id}'})
+        self.labels.invalidate()
+        if self.on_progress:
+            self.on_progress(self)
+
+    def _import_records(self, batch):
+        records = []
+        for row_number, row in batch:
+            record = self._normalize(row)
+            if record is None:
+                self._fail(row_number, '缺少文物名称(Name)')
+                continue
+            records.append((row_number, record))
+        if not records:
+            return
+
+        try:
+            self._insert_records([record for _, record in records])
+            db.session.commit()
+            self.imported += len(records)
+        except Exception:
+            db.session.rollback()
+            # 回滚后本批新建的标签不再存在，清空缓存重新解析
+            self.labels.reset()
+            self._import_one_by_one(records)
+
+    def _import_one_by_one(self, records):
+        """整批失败时逐行重试，定位出错的行"""
+        for row_number, record in records:
+            try:
+                self._insert_records([record])
+                db.session.commit()
+                self.imported += 1
+            except Exception as e:
+                db.session.rollback()
+                self.labels.reset()
+                self._fail(row_number, str(e))
+
+    def _insert_records(self, records):
+        self.labels.resolve_all({column: {r[column] for r in records} for column in LABEL_COLUMNS})
+
+        mappings = []
+        for r in records:
+            mapping = {
+                'museum_id': self.museum_id,
+                'name': r['Name'],
+                'description': r['Description'],
+            }
+            for column, (_, _, fk, _) in LABEL_COLUMNS.items():
+                mapping[fk] = self.labels.id_of(column, r[column])
+            mappings.append(mapping)
+
+        db.session.execute(insert(Artifact), mappings)
+        StatDelta().add_rows(mappings).apply()
+        self._bulk_log('Artifact', 'bulk_create', len(mappings))
+
+    def _normalize(self, row):
+        name = _clean(row.get('Name'))
+        if name is None:
+            return None
+        record = {'Name': name, 'Description': _clean(row.get('Description'))}
+        for column in LABEL_COLUMNS:
+            record[column] = _clean(row.get(column)) or DEFAULT_LABELS.get(column)
+        return record
+
+    def _bulk_log(self, table_name, action, count):
+        bulk_log(table_name, action, count, self.user_id)
+
+    def _fail(self, row_number, message):
+        self.failed += 1
+        self.errors.append((row_number, message))
@@ -0,0 +1,201 @@
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from models import db, Job
+from importer import BulkImporter, count_rows, read_rows
+from purge import count_artifacts, purge_museum
+from retention import archive_logs
+from images import prefetch_urls
+from search import get_search_index
+
+# ==============================
+# 后台任务队列（本地线程池，无需外部消息队列）
+# ==============================
+
+_executor = None
+
+# 是否已有一次搜索索引同步在排队（尚未开始执行）
+_search_refresh_queued = False
+_search_refresh_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config['JOB_WORKERS'],
+            thread_name_prefix='job'
+        )
+    return _executor
+
+
+def shutdown_jobs():
+    """等待线程池中已提交的任务全部结束后关闭线程池（之后提交的任务会新建线程池）。删表重建前调用"""
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def submit_import(app, museum_id, file_path, user_id=None):
+    """登记一个导入任务并交给线程池执行，立即返回 Job"""
+    job = Job(kind='import', state='pending', museum_id=museum_id,
+              file_path=file_path, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor(app).submit(_run_job, app, job.id, _import_file)
+    return job
+
+
+def submit_log_archive(app, user_id=None):
+    """登记一个日志归档任务（定时任务或管理员手动触发）"""
+    job = Job(kind='log_archive', state='pending', user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor(app).submit(_run_job, app, job.id, _archive_logs)
+    return job
+
+
+def submit_museum_delete(app, museum_id, user_id=None):
+    """登记一个强制删除博物馆的任务（分批删除其下文物）"""
+    job = Job(kind='museum_delete', state='pending', museum_id=museum_id, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor(app).submit(_run_job, app, job.id, _delete_museum)
+    return job
+
+
+def submit_image_prefetch(app, museum_id=None, user_id=None):
+    """登记一个图片预取任务：下载博物馆（为空时为全部）文物引用的、尚未缓存的图片并生成缩略图"""
+    job = Job(kind='image_prefetch', state='pending', museum_id=museum_id, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor(app).submit(_run_job, app, job.id, _prefetch_images)
+    return job
+
+
+def submit_search_refresh(app):
+    """
+    把搜索索引的同步（处理待更新的文物/博物馆）交给线程池，请求中不再等待。
+    每次提交都会触发，不登记 Job 记录；已有一次在排队时直接返回 None。
+    """
+    global _search_refresh_queued
+    with _search_refresh_lock:
+        if _search_refresh_queued:
+            return None
+        _search_refresh_queued = True
+    return _get_executor(app).submit(_refresh_search, app)
+
+
+def _refresh_search(app):
+    global _search_refresh_queued
+    with _search_refresh_lock:
+        # 开始执行前清除标记：此后登记的修改会再排一次，不会漏掉
+        _search_refresh_queued = False
+    with app.app_context():
+        try:
+            get_search_index().refresh()
+        except Exception:
+            # 待更新列表保留在索引库中，下次同步时重试
+            app.logger.error('搜索索引同步失败：\n%s', traceback.format_exc())
+
+
+def _run_job(app, job_id, target):
+    """在独立的应用上下文（独立数据库会话）中执行任务，并维护任务状态"""
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.state = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        try:
+            target(app, job)
+            job.state = 'done'
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('任务 %s 执行失败：\n%s', job_id, traceback.format_exc())
+            job.state = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _import_file(app, job):
+    job.total_rows = count_rows(job.file_path)
+    db.session.commit()
+
+    def report(importer):
+        # 每批提交后刷新进度，前端轮询即可看到
+        job.rows_processed = importer.processed
+        job.rows_failed = importer.failed
+        db.session.commit()
+
+    importer = BulkImporter(
+        job.museum_id,
+        user_id=job.user_id,
+        batch_size=app.config['IMPORT_BATCH_SIZE'],
+        on_progress=report
+    )
+    try:
+        importer.run(read_rows(job.file_path))
+    finally:
+        if importer.imported:
+            submit_search_refresh(app)
+
+    if importer.errors:
+        # 只保留前几条失败原因
+        job.error = '\n'.join(f'第 {n} 行：{msg}' for n, msg in importer.errors[:10])
+    if importer.imported:
+        # 新导入的图片在后台预先下载并生成缩略图，首次浏览时就能直接使用
+        submit_image_prefetch(app, job.museum_id, user_id=job.user_id)
+
+
+def _archive_logs(app, job):
+    def report(total):
+        job.rows_processed = total
+        db.session.commit()
+
+    archive_logs(
+        app.config['LOG_ARCHIVE_DIR'],
+        app.config['LOG_RETENTION_DAYS'],
+        batch_size=app.config['LOG_ARCHIVE_BATCH_SIZE'],
+        on_progress=report
+    )
+
+
+def _delete_museum(app, job):
+    job.total_rows = count_artifacts(job.museum_id)
+    db.session.commit()
+
+    def report(total):
+        job.rows_processed = total
+        db.session.commit()
+
+    try:
+        purge_museum(
+            job.museum_id,
+            batch_size=app.config['MUSEUM_DELETE_BATCH_SIZE'],
+            user_id=job.user_id,
+            on_progress=report
+        )
+    finally:
+        submit_search_refresh(app)
+
+
+def _prefetch_images(app, job):
+    pipeline = app.extensions['images']
+    urls = prefetch_urls(pipeline.store, job.museum_id)
+    job.total_rows = len(urls)
+    db.session.commit()
+
+    # 下载与生成缩略图在图片线程池中并行进行，这里只汇总进度
+    futures = [pipeline.submit(url) for url in urls]
+    for done, future in enumerate(as_completed(futures), 1):
+        if 'digest' not in future.result():
+            job.rows_failed += 1
+        job.rows_processed = done
+        if done % 20 == 0 or done == len(futures):
+            db.session.commit()
+    if job.rows_failed:
+        job.error = f'{job.rows_failed} 张图片下载失败，{app.config["IMAGE_RETRY_AFTER"]} 秒后可再次预取'
@@ -0,0 +1,155 @@
+from sqlalchemy import insert, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from audit import bulk_log
+from cache import invalidate_tags
+from models import (
+    db,
+    Category, Dynasty, Image,
+    MotifAndPattern, ObjectType, FormAndStructure
+)
+
+# ==============================
+# 标签解析：名称/URL -> id，不存在则创建
+# ==============================
+
+# 标签列名 -> (标签模型, 名称字段, Artifact 外键字段, 摘要字段)
+# 摘要字段不为空的表按摘要（model.digest）查找（Text 列没有索引），写入时一并填好摘要；
+# 图片的摘要按规范化 URL 计算，写法不同的同一地址解析为同一条记录。
+# 列名与导入表格的表头一致。
+LABEL_COLUMNS = {
+    'Category': (Category, 'name', 'category_id', None),
+    'Dynasty': (Dynasty, 'name', 'dynasty_id', None),
+    'Image': (Image, 'url', 'image_id', 'url_hash'),
+    'MotifAndPattern': (MotifAndPattern, 'name', 'motif_id', 'name_hash'),
+    'ObjectType': (ObjectType, 'name', 'object_type_id', 'name_hash'),
+    'FormAndStructure': (FormAndStructure, 'name', 'form_structure_id', 'name_hash'),
+}
+
+# 表单 / JSON 中的标签字段 -> 标签列名
+LABEL_FIELDS = {
+    'category': 'Category',
+    'dynasty': 'Dynasty',
+    'image_url': 'Image',
+    'motif': 'MotifAndPattern',
+    'object_type': 'ObjectType',
+    'form_structure': 'FormAndStructure',
+}
+
+# 为空时使用的默认值（与旧导入逻辑保持一致）
+DEFAULT_LABELS = {
+    'Category': '未知类别',
+    'Dynasty': '未知朝代',
+}
+
+# IN (...) 查询每次最多携带的值数量
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def insert_ignore(model):
+    """
+    遇到唯一键冲突时跳过的 INSERT：
+    MySQL/MariaDB 用 INSERT IGNORE，SQLite/PostgreSQL 用 ON CONFLICT DO NOTHING。
+    并发请求同时创建同名标签时不会因唯一索引报错，之后统一按唯一键查回 id。
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        return insert(model).prefix_with('IGNORE')
+    if dialect == 'sqlite':
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(model).on_conflict_do_nothing()
+    return insert(model)
+
+
+class LabelResolver:
+    """
+    把标签值（类别名、图片 URL 等）批量解析为 id，结果缓存在 名称->id 字典中：
+    1. 所有列的待查值合成一条 UNION ALL 查询；
+    2. 仍不存在的值按表各一条多行 INSERT IGNORE；
+    3. 再用一条 UNION ALL 查回新建的 id。
+    只使用当前会话的事务，不提交；新建的标签汇总记一条日志，
+    调用方在提交后调用 invalidate() 失效标签缓存。
+    """
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.ids = {column: {} for column in LABEL_COLUMNS}
+        self.created = set()  # 新建过标签的模型名，用于缓存失效
+
+    def reset(self):
+        """事务回滚后调用：本批新建的标签已不存在"""
+        self.ids = {column: {} for column in LABEL_COLUMNS}
+
+    def id_of(self, column, value):
+        return self.ids[column].get(value) if value else None
+
+    def resolve(self, column, values):
+        """解析一列标签值的 id，不存在的批量创建"""
+        self.resolve_all({column: values})
+
+    def resolve_all(self, values_by_column):
+        """一次解析多列：{'Category': {'青铜器'}, 'Image': {'http://...'}}"""
+        pending = {}
+        for column, values in values_by_column.items():
+            values = {v for v in values if v} - self.ids[column].keys()
+            if values:
+                pending[column] = values
+        if not pending:
+            return
+        self._select_ids(pending)
+
+        missing = {column: sorted(v for v in values if v not in self.ids[column])
+                   for column, values in pending.items()}
+        missing = {column: values for column, values in missing.items() if values}
+        if not missing:
+            return
+        for column, values in missing.items():
+            model, attr, _, hash_attr = LABEL_COLUMNS[column]
+            for chunk in _chunks(values, LOOKUP_CHUNK_SIZE):
+                rows = {}
+                for v in chunk:
+                    # 摘要相同的多个写法只插入第一个
+                    digest = model.digest(v) if hash_attr else v
+                    rows.setdefault(digest, {attr: v, hash_attr: digest} if hash_attr else {attr: v})
+                db.session.execute(insert_ignore(model), list(rows.values()))
+        self._select_ids(missing)
+        for column, values in missing.items():
+            model, _, _, hash_attr = LABEL_COLUMNS[column]
+            # 摘要相同的多个写法只新建一条
+            created = len({model.digest(v) for v in values}) if hash_attr else len(values)
+            bulk_log(model.__name__, 'bulk_create', created, self.user_id)
+            self.created.add(model.__name__)
+
+    def invalidate(self):
+        """提交后失效新建标签所在表的缓存"""
+        invalidate_tags({f'labels:{name}' for name in self.created})
+        self.created.clear()
+
+    def _select_ids(self, values_by_column):
+        # 查找键 -> [原始值]：有摘要字段的按摘要查，否则按名称查
+        keys = {}
+        selects = []
+        for column, values in values_by_column.items():
+            model, attr, _, hash_attr = LABEL_COLUMNS[column]
+            field = getattr(model, hash_attr or attr)
+            keys[column] = {}
+            for v in values:
+                keys[column].setdefault(model.digest(v) if hash_attr else v, []).append(v)
+            for chunk in _chunks(keys[column], LOOKUP_CHUNK_SIZE):
+                selects.append(
+                    select(literal(column).label('label_column'), model.id.label('id'), field.label('label_key'))
+                    .where(field.in_(chunk))
+                )
+        statement = selects[0] if len(selects) == 1 else union_all(*selects)
+        # 历史数据中可能存在重名记录，按 id 顺序取第一条（与 .first() 行为一致）
+        rows = sorted(db.session.execute(statement), key=lambda row: row.id)
+        for column, record_id, key in rows:
+            for value in keys[column][key]:
+                self.ids[column].setdefault(value, record_id)
@@ -1,4 +1,8 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from flask import request # 获取页码，支持分页显示
@@ -11,6 +15,8 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(64), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), default='guest')
+    # 用户被修改（角色、密码等）时加一；各进程的登录用户缓存每次使用前都与之比对，见 cache.load_cached_user
+    auth_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -33,22 +39,88 @@ class Dynasty(db.Model):
     name = db.Column(db.String(128), unique=True, nullable=False)
     
 
-class MotifAndPattern(db.Model):
+def label_hash(value):
+    """标签值的定长摘要（去掉首尾空白后取 SHA-1），用于 Text 列的唯一索引和等值查找"""
+    return hashlib.sha1(value.strip().encode('utf-8')).hexdigest()
+
+
+def canonical_url(url):
+    """
+    图片 URL 的规范形式，只用于判断是否为同一张图片（库中仍保存原始 URL）：
+    去掉首尾空白，http 与 https 视为相同，主机名小写并去掉默认端口，
+    去掉路径末尾的 /，查询参数按名称排序，去掉 #片段。非 http(s) 地址只去空白。
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https') or not parts.hostname:
+        return url
+    host = parts.hostname
+    if parts.port and parts.port not in (80, 443):
+        host = f'{host}:{parts.port}'
+    if parts.username:
+        host = f'{parts.username}:{parts.password}@{host}' if parts.password else f'{parts.username}@{host}'
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(('https', host, path, query, ''))
+
+
+def url_digest(url):
+    """图片 URL 的摘要：规范形式的 SHA-1"""
+    return label_hash(canonical_url(url))
+
+
+class HashedNameMixin:
+    """name 为 Text 的标签表：无法直接建唯一索引，改为对 name_hash 建唯一索引"""
+    name_hash = db.Column(db.String(40), unique=True)
+
+    @validates('name')
+    def _update_name_hash(self, key, value):
+        self.name_hash = label_hash(value) if value is not None else None
+        return value
+
+    @staticmethod
+    def digest(name):
+        return label_hash(name)
+
+    @classmethod
+    def lookup(cls, name):
+        """按名称精确查找（走 name_hash 索引）"""
+        return cls.query.filter_by(name_hash=label_hash(name)).first()
+
+
+class MotifAndPattern(HashedNameMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.Text, nullable=False)
 
-class ObjectType(db.Model):
+class ObjectType(HashedNameMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.Text, nullable=False)
     
 
-class FormAndStructure(db.Model):
+class FormAndStructure(HashedNameMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.Text, nullable=False)
 
 class Image(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(256), nullable=False)
+    url_hash = db.Column(db.String(40), unique=True)  # 规范化 url 的 SHA-1，唯一索引
+    content_hash = db.Column(db.String(64), index=True)  # 图片内容的 SHA-256，下载后填写，用于合并内容相同的记录
+
+    @validates('url')
+    def _update_url_hash(self, key, value):
+        self.url_hash = url_digest(value) if value is not None else None
+        return value
+
+    @staticmethod
+    def digest(url):
+        return url_digest(url)
+
+    @classmethod
+    def lookup(cls, url):
+        """按 URL 查找（规范化后走 url_hash 索引，http/https、参数顺序等差异视为同一地址）"""
+        return cls.query.filter_by(url_hash=url_digest(url)).first()
 
 # ==================== 博物馆表 ====================
 class Museum(db.Model):
@@ -66,6 +138,18 @@ class Museum(db.Model):
 
 class Artifact(db.Model):
     __tablename__ = 'artifact'
+    __table_args__ = (
+        # 列表页：WHERE museum_id = ? ORDER BY name, id（键集分页）
+        db.Index('ix_artifact_museum_name_id', 'museum_id', 'name', 'id'),
+        # 跨馆列表：ORDER BY name, id（键集分页）
+        db.Index('ix_artifact_name_id', 'name', 'id'),
+        # 分面筛选与统计：WHERE museum_id = ? AND <facet>_id = ? / GROUP BY <facet>_id
+        db.Index('ix_artifact_museum_category', 'museum_id', 'category_id'),
+        db.Index('ix_artifact_museum_dynasty', 'museum_id', 'dynasty_id'),
+        db.Index('ix_artifact_museum_motif', 'museum_id', 'motif_id'),
+        db.Index('ix_artifact_museum_object_type', 'museum_id', 'object_type_id'),
+        db.Index('ix_artifact_museum_form_structure', 'museum_id', 'form_structure_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     # 博物馆不能随意删除（有文物时禁止删除）
@@ -105,6 +189,10 @@ class Artifact(db.Model):
 
 
 class Log(db.Model):
+    __table_args__ = (
+        db.Index('ix_log_table_record', 'table_name', 'record_id'),   # 查看某条记录的历史
+        db.Index('ix_log_user_timestamp', 'user_id', 'timestamp'),    # 按用户 + 时间筛选
+    )
     id = db.Column(db.Integer, primary_key=True)
     
     table_name = db.Column(db.String(50), nullable=False)       # 如 'Artifact', 'Category'
@@ -119,4 +207,89 @@ class Log(db.Model):
     user = db.relationship('User', backref='logs')
 
     def __repr__(self):
-        return f'<Log {self.action} {self.table_name}#{self.record_id} by {self.user.username if self.user else "unknown"}>'
\ No newline at end of file
+        return f'<Log {self.action} {self.table_name}#{self.record_id} by {self.user.username if self.user else "unknown"}>'
+
+# ==================== 后台任务表 ====================
+
+class Job(db.Model):
+    """后台任务（如 Excel 导入、强制删除博物馆），记录状态与进度，供前端轮询"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False, index=True)           # 'import' / 'log_archive' / 'museum_delete'
+    state = db.Column(db.String(20), nullable=False, default='pending')   # pending / running / done / failed
+
+    museum_id = db.Column(db.Integer, db.ForeignKey('museum.id', ondelete='SET NULL'), nullable=True)
+    file_path = db.Column(db.String(512))
+
+    total_rows = db.Column(db.Integer)                      # 未知时为空
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+
+    museum = db.relationship('Museum')
+
+    @property
+    def elapsed(self):
+        """已耗时（秒）"""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or datetime.utcnow()
+        return (end - self.started_at).total_seconds()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'museum_id': self.museum_id,
+            'total_rows': self.total_rows,
+            'rows_processed': self.rows_processed,
+            'rows_failed': self.rows_failed,
+            'elapsed': round(self.elapsed, 2),
+            'error': self.error,
+        }
+
+    def __repr__(self):
+        return f'<Job {self.kind}#{self.id} {self.state}>'
+
+# ==================== 统计汇总表 ====================
+# 由 stats.py 随文物增删改增量维护，flask stats-rebuild 可从原始数据重算。
+# 汇总表不设外键：博物馆、标签删除时由 stats.py 自行清理对应的行。
+
+class ArtifactStat(db.Model):
+    """按 (博物馆, 类别, 朝代) 汇总的文物数量"""
+    museum_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)   # 0 表示未标注
+    dynasty_id = db.Column(db.Integer, primary_key=True, autoincrement=False)    # 0 表示未标注
+    total = db.Column(db.Integer, nullable=False, default=0)
+    with_image = db.Column(db.Integer, nullable=False, default=0)               # 其中有图片的数量
+
+    def __repr__(self):
+        return f'<ArtifactStat {self.museum_id}/{self.category_id}/{self.dynasty_id}: {self.total}>'
+
+
+class LabelUsageStat(db.Model):
+    """各标签被多少件文物使用"""
+    kind = db.Column(db.String(32), primary_key=True)          # 'category' / 'dynasty' / 'motif' / ... / 'image'
+    label_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LabelUsageStat {self.kind}#{self.label_id}: {self.total}>'
+
+
+class ActivityStat(db.Model):
+    """按天汇总的操作量，来自操作日志；批量日志（如 'bulk_create 500'）按实际条数计"""
+    day = db.Column(db.Date, primary_key=True)
+    table_name = db.Column(db.String(50), primary_key=True)
+    action = db.Column(db.String(32), primary_key=True)        # 'create' / 'update' / 'delete' / 'merge'
+    # 分槽计数：同一天同一操作的累加随机分散到几行，并发写入不争同一行锁；读取时按槽求和
+    slot = db.Column(db.SmallInteger, primary_key=True, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ActivityStat {self.day} {self.table_name}.{self.action}[{self.slot}]: {self.total}>'
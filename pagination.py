@@ -0,0 +1,126 @@
+import base64
+import json
+
+from sqlalchemy import and_, func, or_, select
+
+from models import db
+
+# ==============================
+# 键集（seek）分页
+# ==============================
+
+
+def encode_cursor(values):
+    """把排序键（如 [名称, id]）编码为 URL 安全的不透明游标"""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """解析游标，格式不对时返回 None（当作第一页处理）"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _seek_condition(columns, values, forward, descending=False):
+    """(c1, c2, ...) > (v1, v2, ...) 展开为 OR/AND 形式，兼容各数据库并能利用复合索引"""
+    greater = forward != descending
+    conditions = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        compare = column > values[i] if greater else column < values[i]
+        conditions.append(and_(*equal, compare))
+    return or_(*conditions)
+
+
+class KeysetPage:
+    """一页键集分页结果，接口尽量与 Flask-SQLAlchemy 的 Pagination 保持一致"""
+
+    def __init__(self, items, per_page, has_next, has_prev, next_cursor, prev_cursor,
+                 total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+
+def keyset_paginate(query, columns, per_page, after=None, before=None,
+                    count_mode='exact', count_cap=1000, descending=False, decode=None):
+    """
+    按 columns（最后一列须唯一，如 (name, id)）做键集分页，descending 表示全部降序。
+    after/before 为上一页返回的游标；每页只查 per_page + 1 行，不使用 OFFSET，
+    所以翻到第 N 页与第 1 页的代价相同。
+
+    count_mode:
+        'exact'  精确 COUNT(*)
+        'approx' 最多数到 count_cap 行，超过则显示为 “count_cap+”
+        'none'   不统计总数
+
+    decode: 可选，把游标中的 JSON 值还原为列的类型（如字符串 -> datetime）
+    """
+    after_values = decode_cursor(after, len(columns))
+    before_values = decode_cursor(before, len(columns)) if after_values is None else None
+    if decode:
+        after_values = decode(after_values) if after_values is not None else None
+        before_values = decode(before_values) if before_values is not None else None
+
+    forward_order = [c.desc() if descending else c.asc() for c in columns]
+    backward_order = [c.asc() if descending else c.desc() for c in columns]
+
+    page_query = query.order_by(None)
+    if before_values is not None:
+        page_query = page_query.filter(_seek_condition(columns, before_values, False, descending)) \
+            .order_by(*backward_order)
+    else:
+        if after_values is not None:
+            page_query = page_query.filter(_seek_condition(columns, after_values, True, descending))
+        page_query = page_query.order_by(*forward_order)
+
+    rows = page_query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before_values is not None:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after_values is not None, more
+
+    def key_of(item):
+        return [getattr(item, c.key) for c in columns]
+
+    total, estimate = _count(query, count_mode, count_cap)
+    return KeysetPage(
+        rows, per_page,
+        has_next=has_next and bool(rows),
+        has_prev=has_prev and bool(rows),
+        next_cursor=encode_cursor(key_of(rows[-1])) if rows else None,
+        prev_cursor=encode_cursor(key_of(rows[0])) if rows else None,
+        total=total,
+        total_is_estimate=estimate
+    )
+
+
+def _count(query, count_mode, count_cap):
+    if count_mode == 'none':
+        return None, False
+    base = query.order_by(None)
+    if count_mode == 'approx':
+        limited = base.limit(count_cap + 1).subquery()
+        total = db.session.execute(select(func.count()).select_from(limited)).scalar()
+        if total > count_cap:
+            return count_cap, True
+        return total, False
+    return base.count(), False
@@ -0,0 +1,61 @@
+from sqlalchemy import delete, func, select
+
+from audit import bulk_log
+from cache import invalidate_tags
+from models import db, Artifact, Museum
+from search import get_search_index
+from stats import StatDelta, STAT_COLUMNS
+
+# ==============================
+# 强制删除博物馆（分批删除其下文物）
+# ==============================
+#
+# 每批先按 id 取出至多 batch_size 个文物 id，再 DELETE ... WHERE id IN (...)，
+# 每批单独提交并记一条 'bulk_delete N' 汇总日志，锁持有时间与博物馆大小无关；
+# 不把文物加载为 ORM 对象，也不逐个触发 flush 钩子。
+
+
+def count_artifacts(museum_id):
+    return db.session.execute(
+        select(func.count()).select_from(Artifact).where(Artifact.museum_id == museum_id)
+    ).scalar()
+
+
+def purge_museum(museum_id, batch_size=1000, user_id=None, on_progress=None):
+    """分批删除博物馆下的全部文物，最后删除博物馆本身，返回删除的文物数"""
+    total = 0
+    last_id = 0
+    try:
+        while True:
+            # 按 id 递增分段，下一批从上一批最大的 id 之后开始，不会重复扫描已删除的区间；
+            # 同时取出统计字段，用于扣减统计汇总表
+            rows = db.session.execute(
+                select(Artifact.id, *(getattr(Artifact, c) for c in STAT_COLUMNS))
+                .where(Artifact.museum_id == museum_id, Artifact.id > last_id)
+                .order_by(Artifact.id)
+                .limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            db.session.execute(delete(Artifact).where(Artifact.id.in_(ids)))
+            StatDelta().add_rows(rows, -1).apply()
+            bulk_log('Artifact', 'bulk_delete', len(ids), user_id)
+            db.session.commit()
+            # 批量 DELETE 不经过 flush 钩子，需要手动失效缓存
+            invalidate_tags({f'facets:{museum_id}'})
+
+            last_id = ids[-1]
+            total += len(ids)
+            if on_progress:
+                on_progress(total)
+    finally:
+        if total:
+            get_search_index().mark_dirty(museum_ids=[museum_id])
+
+    # 文物已清空，博物馆本身走 ORM 删除（记录操作日志、刷新导航栏缓存）
+    museum = db.session.get(Museum, museum_id)
+    if museum is not None:
+        db.session.delete(museum)
+        db.session.commit()
+    return total
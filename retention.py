@@ -0,0 +1,189 @@
+import gzip
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import delete, select
+
+from models import db, Log, User
+
+# ==============================
+# 操作日志保留与归档
+# ==============================
+#
+# 超过保留期的日志按批写入归档目录下的 gzip JSON Lines 文件（只追加），
+# 每批写完后在 index.jsonl 追加一行索引（文件名、时间范围、条数），
+# 然后再从 log 表中删除这一批，每批单独提交，避免长时间锁表。
+
+INDEX_FILE = 'index.jsonl'
+
+
+def archive_logs(archive_dir, older_than_days, batch_size=5000, on_progress=None):
+    """把 older_than_days 天以前的日志移入归档，返回归档条数"""
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    # 每次运行写一个新文件，每批作为一个独立的 gzip 成员追加进去
+    filename = f'logs-{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz'
+    path = os.path.join(archive_dir, filename)
+
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(Log.id, Log.timestamp, Log.table_name, Log.record_id, Log.action,
+                   Log.user_id, User.username)
+            .outerjoin(User, User.id == Log.user_id)
+            .where(Log.timestamp < cutoff)
+            .order_by(Log.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        records = [_to_record(row) for row in rows]
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                f.write(lines.encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        _append_index(archive_dir, {
+            'file': filename,
+            'min_timestamp': min(r['timestamp'] for r in records),
+            'max_timestamp': max(r['timestamp'] for r in records),
+            'min_id': records[0]['id'],
+            'max_id': records[-1]['id'],
+            'count': len(records),
+        })
+
+        # 先落盘、后删除：中途失败最多导致归档里有重复行，读取时按 (id, 时间) 去重
+        db.session.execute(delete(Log).where(Log.id.in_([r['id'] for r in records])))
+        db.session.commit()
+        total += len(records)
+        if on_progress:
+            on_progress(total)
+    return total
+
+
+def query_archive(archive_dir, start=None, end=None, table_name=None, action=None,
+                  user_id=None, record_id=None, limit=None):
+    """
+    在归档中按条件查找日志，按时间倒序返回。
+    先用 index.jsonl 的时间范围挑出可能相关的文件，只解压这些文件。
+    """
+    files = []
+    for entry in _read_index(archive_dir):
+        if start and entry['max_timestamp'] < _iso(start):
+            continue
+        if end and entry['min_timestamp'] >= _iso(end):
+            continue
+        if entry['file'] not in files:
+            files.append(entry['file'])
+
+    found = {}
+    for filename in files:
+        path = os.path.join(archive_dir, filename)
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if start and record['timestamp'] < _iso(start):
+                    continue
+                if end and record['timestamp'] >= _iso(end):
+                    continue
+                if table_name and record['table_name'] != table_name:
+                    continue
+                if action and not record['action'].startswith(action):
+                    continue
+                if user_id is not None and record['user_id'] != user_id:
+                    continue
+                if record_id is not None and record['record_id'] != record_id:
+                    continue
+                # log 表清空后 id 会被重新使用（SQLite；MySQL 8.0 以前重启后），不同次归档中
+                # id 相同的是不同的日志，只有 id 与时间都相同才是中断重试留下的重复行
+                found[(record['id'], record['timestamp'])] = record
+
+    records = sorted(found.values(), key=lambda r: (r['timestamp'], r['id']), reverse=True)
+    if limit is not None:
+        records = records[:limit]
+    return [_to_log_like(r) for r in records]
+
+
+def latest_archived(archive_dir):
+    """归档中最新一条日志的时间；没有归档时返回 None"""
+    timestamps = [entry['max_timestamp'] for entry in _read_index(archive_dir)]
+    return datetime.fromisoformat(max(timestamps)) if timestamps else None
+
+
+# ---------- 定时归档 ----------
+
+def start_scheduler(app):
+    """按 LOG_RETENTION_INTERVAL（小时）定期提交归档任务；为 0 时不启动"""
+    interval = app.config.get('LOG_RETENTION_INTERVAL', 0)
+    if not interval:
+        return None
+
+    def tick():
+        from jobs import submit_log_archive
+        try:
+            with app.app_context():
+                submit_log_archive(app)
+        finally:
+            schedule()
+
+    def schedule():
+        timer = threading.Timer(interval * 3600, tick)
+        timer.daemon = True
+        timer.start()
+
+    schedule()
+
+
+# ---------- 内部实现 ----------
+
+def _iso(value):
+    # 固定带微秒，保证字符串比较与时间先后一致
+    return value.isoformat(timespec='microseconds')
+
+
+def _to_record(row):
+    return {
+        'id': row.id,
+        'timestamp': _iso(row.timestamp),
+        'table_name': row.table_name,
+        'record_id': row.record_id,
+        'action': row.action,
+        'user_id': row.user_id,
+        'username': row.username,
+    }
+
+
+def _to_log_like(record):
+    """把归档记录转成与 Log 对象属性一致的结构，供 logs.html 直接渲染"""
+    return SimpleNamespace(
+        id=record['id'],
+        timestamp=datetime.fromisoformat(record['timestamp']),
+        table_name=record['table_name'],
+        record_id=record['record_id'],
+        action=record['action'],
+        user_id=record['user_id'],
+        user=SimpleNamespace(username=record['username']) if record['username'] else None,
+    )
+
+
+def _append_index(archive_dir, entry):
+    with open(os.path.join(archive_dir, INDEX_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_index(archive_dir):
+    path = os.path.join(archive_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
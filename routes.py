@@ -1,9 +1,12 @@
-from flask import render_template, redirect, url_for, flash, request,abort
+from flask import (
+    render_template, redirect, url_for, flash, request, abort, jsonify,
+    Response, stream_with_context, send_file, make_response, session, g
+)
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.utils import secure_filename
 from app import app
 from models import (
-    db, User, Artifact, Museum, Log,
+    db, User, Artifact, Museum, Log, Job,
     Category, Dynasty, Image,
     MotifAndPattern, ObjectType, FormAndStructure
 )
@@ -11,13 +14,41 @@ from forms import (
     RegisterForm, LoginForm, EditProfileForm, UserForm,
     ArtifactForm,  LabelForm, ImportForm
 )
-import pandas as pd
+from jobs import submit_import, submit_museum_delete
+from images import VARIANTS, get_image_pipeline
+from labels import LabelResolver, LABEL_COLUMNS, LABEL_FIELDS
+from facets import FACETS, GLOBAL_FACETS, parse_filters, artifact_query
+from pagination import keyset_paginate, KeysetPage, encode_cursor, decode_cursor
+from retention import query_archive
+from audit import collect_audit, write_audit, discard_audit
+from search import (
+    get_search_index, collect_search, resolve_search, commit_search, discard_search,
+    SEARCH_RESULT_LIMIT
+)
+from cache import (
+    get_cache, cached, label_rows, museum_snapshot, user_cache, data_versions,
+    cached_facet_counts, cached_museum_stats, collect_tags, invalidate_tags, bump_user_versions
+)
+from templating import render_metrics
+from stats import EMPTY_STATS, collect_stats, apply_stats, discard_stats, daily_activity, label_usage
+from werkzeug.local import LocalProxy
+from sqlalchemy.orm import joinedload
+from markupsafe import Markup
+from functools import wraps
+import csv
+import hashlib
+import io
 import os
+import time
+from datetime import datetime, timedelta
 
 # 上下文处理，每一次渲染模板前自动把变量注入到所有模板的上下文里。
+# 使用 LocalProxy 延迟求值：只有模板真正遍历 museums 时才读取快照。
 @app.context_processor
 def inject_museums():
-    return {'museums': Museum.query.order_by(Museum.name).all()}
+    return {'museums': _museums_proxy}
+
+_museums_proxy = LocalProxy(museum_snapshot.rows)
 
 # ==============================
 # 基础路由
@@ -78,65 +109,160 @@ def edit_profile():
 # ==============================
 # 文物管理
 # ==============================
+def versioned_list(view):
+    """
+    文物列表的条件请求：ETag 由数据版本号、请求参数、用户与角色算出，
+    浏览器带 If-None-Match 复查且数据未变化时直接返回 304，不执行任何查询和渲染。
+    版本号只在本进程内有效，另按 ARTIFACT_ETAG_TTL 分段，多进程部署下其他进程的修改最多延迟这么久；
+    该配置为 0 时不使用 ETag。有待显示的提示消息时照常渲染。
+    关键词搜索的结果取决于后台同步的搜索索引，另带上 'search' 版本（索引同步完成时加一）。
+    """
+    @wraps(view)
+    def wrapper(**kwargs):
+        ttl = app.config['ARTIFACT_ETAG_TTL']
+        if not ttl or '_flashes' in session:
+            return view(**kwargs)
+        museum_id = kwargs.get('museum_id')
+        keys = [f'facets:{museum_id}' if museum_id else 'facets:all', 'labels', 'museums']
+        if request.args.get('q', '').strip():
+            keys.append('search')
+        g.list_stamp = data_versions.stamp(*keys) + (int(time.time() // ttl), current_user.role, tuple(sorted(request.args.items(multi=True))))
+        # 导航栏显示用户名，ETag 按用户区分；列表部分的渲染缓存只按角色区分（见 _artifact_page）
+        etag = hashlib.sha1(repr((g.list_stamp, current_user.id)).encode('utf-8')).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(**kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # 只允许浏览器缓存，每次使用前都向服务器复查
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
 @app.route('/artifacts/<int:museum_id>')
 @login_required
+@versioned_list
 def artifacts(museum_id):
-    page = request.args.get('page', 1, type=int)
-    
-    # 获取筛选参数
-    category_id = request.args.get('category', type=int)
-    dynasty_id = request.args.get('dynasty', type=int)
-    motif_id = request.args.get('motif', type=int)
-    object_type_id = request.args.get('object_type', type=int)
-    form_structure_id = request.args.get('form_structure', type=int)
-
-    # 基础查询：该博物馆的所有文物
-    query = Artifact.query.filter_by(museum_id=museum_id)
-
-    # 应用筛选
-    if category_id:
-        query = query.filter(Artifact.category_id == category_id)
-    if dynasty_id:
-        query = query.filter(Artifact.dynasty_id == dynasty_id)
-    if motif_id:
-        query = query.filter(Artifact.motif_id == motif_id)
-    if object_type_id:
-        query = query.filter(Artifact.object_type_id == object_type_id)
-    if form_structure_id:
-        query = query.filter(Artifact.form_structure_id == form_structure_id)
-
-    # 排序（
-    query = query.order_by(Artifact.name)
-
-    pagination = query.paginate(page=page, per_page=21, error_out=False)
-
-    # 获取筛选选项（仅显示该博物馆实际拥有的属性值）
-    museum_artifacts = Artifact.query.filter_by(museum_id=museum_id).all()
-
-    categories = sorted({a.category for a in museum_artifacts if a.category}, key=lambda x: x.name)
-    dynasties = sorted({a.dynasty for a in museum_artifacts if a.dynasty}, key=lambda x: x.name)
-    motifs = sorted({a.motif for a in museum_artifacts if a.motif}, key=lambda x: x.name)
-    object_types = sorted({a.object_type for a in museum_artifacts if a.object_type}, key=lambda x: x.name)
-    form_structures = sorted({a.form_structure for a in museum_artifacts if a.form_structure}, key=lambda x: x.name)
-
     museum = Museum.query.get_or_404(museum_id)
+    return _artifact_page(museum, parse_filters(request.args))
+
+@app.route('/artifacts')
+@login_required
+@versioned_list
+def browse_artifacts():
+    """跨馆浏览/搜索：与单馆列表相同的筛选，另加博物馆分面"""
+    return _artifact_page(None, parse_filters(request.args, GLOBAL_FACETS))
+
+def _artifact_page(museum, filters):
+    """
+    列表部分（筛选栏、卡片、分页）只与数据版本、请求参数、角色有关，不含用户名等个人信息，
+    开启 ARTIFACT_FRAGMENT_TTL 后按 versioned_list 算出的版本戳缓存渲染结果，同角色的用户共享。
+    """
+    stamp = g.get('list_stamp')
+    ttl = app.config['ARTIFACT_FRAGMENT_TTL']
+    if stamp is None or not ttl:
+        list_html = _artifact_list(museum, filters)
+    else:
+        list_html = cached(('artifact_list', museum.id if museum else None) + stamp,
+                           lambda: _artifact_list(museum, filters), ttl=ttl)
+    return render_template('artifacts.html', museum=museum, list_html=Markup(list_html))
+
+# 卡片上要显示的关联标签，列表页与搜索结果统一预加载
+_CARD_OPTIONS = (
+    joinedload(Artifact.category), joinedload(Artifact.dynasty), joinedload(Artifact.image),
+    joinedload(Artifact.motif), joinedload(Artifact.object_type), joinedload(Artifact.form_structure)
+)
+
+def _artifact_list(museum, filters, per_page=21):
+    """文物列表；museum 为 None 时列出全部博物馆的文物"""
+    museum_id = museum.id if museum else None
+    q = request.args.get('q', '').strip()
+    if q:
+        return _search_artifacts(museum, q, filters, per_page)
+
+    # 基础查询：该博物馆的所有文物，并应用筛选
+    query = artifact_query(museum_id, filters).options(*_CARD_OPTIONS)
+    if museum is None:
+        query = query.options(joinedload(Artifact.museum))
+
+    # 分页：默认按 (名称, id) 键集分页，深页与第一页代价相同；也可配置回传统页码分页
+    keyset = app.config['ARTIFACT_PAGINATION'] == 'keyset'
+    if keyset:
+        pagination = keyset_paginate(
+            query, (Artifact.name, Artifact.id), per_page=per_page,
+            after=request.args.get('after'), before=request.args.get('before'),
+            # 跨馆时总数可能很大，只数到上限
+            count_mode=app.config['ARTIFACT_COUNT_MODE'] if museum else 'approx', count_cap=10000
+        )
+    else:
+        query = query.order_by(Artifact.name, Artifact.id)
+        pagination = query.paginate(page=request.args.get('page', 1, type=int), per_page=per_page, error_out=False)
+
+    # 获取筛选选项（仅显示实际拥有的属性值，并附带数量）
+    facets = cached_facet_counts(museum_id, filters)
+    return _render_artifacts(museum, pagination, keyset, filters, facets)
+
+def _search_artifacts(museum, q, filters, per_page):
+    """关键词搜索：结果按相关度排序，游标中保存的是结果序号"""
+    index = get_search_index()
+    museum_id = museum.id if museum else None
+    ids = index.search(q, museum_id=museum_id, filters=filters)
+
+    cursor = decode_cursor(request.args.get('after') or request.args.get('before'), 1)
+    offset = max(int(cursor[0]), 0) if cursor and isinstance(cursor[0], int) else 0
+    page_ids = ids[offset:offset + per_page]
+
+    # 按 id 取出本页文物后恢复相关度顺序；索引尚未同步删除的文物自然被跳过
+    options = _CARD_OPTIONS if museum else _CARD_OPTIONS + (joinedload(Artifact.museum),)
+    loaded = {a.id: a for a in Artifact.query.options(*options).filter(Artifact.id.in_(page_ids))} \
+        if page_ids else {}
+    items = [loaded[i] for i in page_ids if i in loaded]
+
+    pagination = KeysetPage(
+        items, per_page,
+        has_next=offset + per_page < len(ids), has_prev=offset > 0,
+        next_cursor=encode_cursor([offset + per_page]),
+        prev_cursor=encode_cursor([max(offset - per_page, 0)]),
+        total=len(ids), total_is_estimate=len(ids) >= SEARCH_RESULT_LIMIT
+    )
+    facets = index.facet_counts(q, museum_id=museum_id, filters=filters,
+                                facets=FACETS if museum else GLOBAL_FACETS)
+    return _render_artifacts(museum, pagination, True, filters, facets, q)
+
+def _render_artifacts(museum, pagination, keyset, filters, facets, q=None):
+    # 翻页链接要带上的参数：路由参数 + 筛选条件 + 关键词
+    link_args = dict(filters)
+    if museum:
+        link_args['museum_id'] = museum.id
+    if q:
+        link_args['q'] = q
 
     return render_template(
-        'artifacts.html',
+        'artifact_list.html',
         museum=museum,
         artifacts=pagination.items,
         pagination=pagination,
-        categories=categories,
-        dynasties=dynasties,
-        motifs=motifs,
-        object_types=object_types,
-        form_structures=form_structures,
+        keyset=keyset,
+        q=q,
+        list_endpoint='artifacts' if museum else 'browse_artifacts',
+        list_args={'museum_id': museum.id} if museum else {},
+        link_args=link_args,
+        museum_facets=facets.get('museum'),
+        categories=facets['category'],
+        dynasties=facets['dynasty'],
+        motifs=facets['motif'],
+        object_types=facets['object_type'],
+        form_structures=facets['form_structure'],
         # 当前筛选值，用于高亮选中
-        selected_category=category_id,
-        selected_dynasty=dynasty_id,
-        selected_motif=motif_id,
-        selected_object_type=object_type_id,
-        selected_form_structure=form_structure_id
+        selected_museum=filters.get('museum'),
+        selected_category=filters.get('category'),
+        selected_dynasty=filters.get('dynasty'),
+        selected_motif=filters.get('motif'),
+        selected_object_type=filters.get('object_type'),
+        selected_form_structure=filters.get('form_structure')
     )
 
 @app.route('/artifact/add/<int:museum_id>', methods=['GET', 'POST'])
@@ -151,31 +277,20 @@ def add_artifact(museum_id):
     form = ArtifactForm()
 
     if form.validate_on_submit():
-        # 自动创建或获取关联记录
-        _create_or_get_associated_records(form)
-
-        category = Category.query.filter_by(name=form.category.data).first()
-        dynasty = Dynasty.query.filter_by(name=form.dynasty.data).first()
-        image = Image.query.filter_by(url=form.image_url.data).first() if form.image_url.data else None
-        motif = MotifAndPattern.query.filter_by(name=form.motif.data).first() if form.motif.data else None
-        obj_type = ObjectType.query.filter_by(name=form.object_type.data).first() if form.object_type.data else None
-        form_struct = FormAndStructure.query.filter_by(name=form.form_structure.data).first() if form.form_structure.data else None
+        # 自动创建或获取关联记录（与文物在同一个事务中）
+        labels = LabelResolver(current_user.id)
 
         # 创建通用 Artifact 实例
         artifact = Artifact(
             museum_id=museum_id,
             name=form.name.data,
             description=form.description.data or None,  # 台北特有字段，可为空
-            category_id=category.id if category else None,
-            dynasty_id=dynasty.id if dynasty else None,
-            image_id=image.id if image else None,
-            motif_id=motif.id if motif else None,
-            object_type_id=obj_type.id if obj_type else None,
-            form_structure_id=form_struct.id if form_struct else None
+            **_resolve_form_labels(form, labels)
         )
 
         db.session.add(artifact)
         db.session.commit()
+        labels.invalidate()
 
         flash(f'{museum.name} 文物添加成功', 'success')
         return redirect(url_for('artifacts', museum_id=museum_id))
@@ -203,26 +318,19 @@ def edit_artifact(museum_id, id):
     form = ArtifactForm(obj=artifact)  # 自动填充表单
 
     if form.validate_on_submit():
-        _create_or_get_associated_records(form)
-
-        category = Category.query.filter_by(name=form.category.data).first()
-        dynasty = Dynasty.query.filter_by(name=form.dynasty.data).first()
-        image = Image.query.filter_by(url=form.image_url.data).first() if form.image_url.data else None
-        motif = MotifAndPattern.query.filter_by(name=form.motif.data).first() if form.motif.data else None
-        obj_type = ObjectType.query.filter_by(name=form.object_type.data).first() if form.object_type.data else None
-        form_struct = FormAndStructure.query.filter_by(name=form.form_structure.data).first() if form.form_structure.data else None
+        labels = LabelResolver(current_user.id)
+        # 先解析标签再修改文物：解析时的查询会触发自动 flush，
+        # 若文物已被修改，会被提前写入一次（多一条 UPDATE 和一条日志）
+        label_ids = _resolve_form_labels(form, labels)
 
         # 更新字段
         artifact.name = form.name.data
         artifact.description = form.description.data or None
-        artifact.category_id = category.id if category else None
-        artifact.dynasty_id = dynasty.id if dynasty else None
-        artifact.image_id = image.id if image else None
-        artifact.motif_id = motif.id if motif else None
-        artifact.object_type_id = obj_type.id if obj_type else None
-        artifact.form_structure_id = form_struct.id if form_struct else None
+        for fk, label_id in label_ids.items():
+            setattr(artifact, fk, label_id)
 
         db.session.commit()
+        labels.invalidate()
 
         flash(f'{museum.name} 文物修改成功', 'success')
         return redirect(url_for('artifacts', museum_id=museum_id))
@@ -252,6 +360,40 @@ def delete_artifact(museum_id, id):
     flash('文物删除成功', 'success')
     return redirect(url_for('artifacts', museum_id=museum_id))
 
+# ==============================
+# 图片缩略图
+# ==============================
+
+# 派生图片的 URL 带有 v=<url_hash 前缀>，图片地址改变时 URL 随之改变，因此可以长期缓存
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+@app.route('/images/<int:id>/<variant>')
+@login_required
+def image_variant(id, variant):
+    """本地缓存的缩略图；尚未下载时先临时跳转到原图，同时在后台下载并生成缩略图"""
+    if variant not in VARIANTS:
+        abort(404)
+    image = Image.query.get_or_404(id)
+    pipeline = get_image_pipeline()
+    entry = pipeline.store.entry(image.url)
+    if not pipeline.store.is_usable(entry):
+        if pipeline.store.needs_fetch(image.url):
+            pipeline.submit(image.url)
+        response = redirect(image.url)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    path, mimetype, etag = pipeline.store.variant(entry, variant, request.accept_mimetypes['image/webp'] > 0)
+    response = send_file(path, mimetype=mimetype, etag=etag, max_age=IMAGE_MAX_AGE, conditional=True)
+    # 需要登录才能访问，只允许浏览器缓存；按 Accept 选择 WebP 或 JPEG
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    # 按声明的图片类型处理，浏览器不再自行猜测内容类型
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
 
 # ==============================
 # 用户管理
@@ -329,7 +471,7 @@ def delete_user(id):
 @app.route('/labels_motif')
 @login_required
 def labels_motif():
-    labels = MotifAndPattern.query.all()
+    labels = label_rows(MotifAndPattern)
     return render_template('labels.html', items=labels, type='MotifAndPattern',
                            add_route='add_motif', edit_route='edit_motif', delete_route='delete_motif')
 
@@ -341,6 +483,9 @@ def add_motif():
         return redirect(url_for('index'))
     form = LabelForm()
     if form.validate_on_submit():
+        if MotifAndPattern.lookup(form.name.data):
+            flash('图案标签已存在', 'error')
+            return render_template('label_form.html', form=form, title='添加图案标签')
         label = MotifAndPattern(name=form.name.data)
         db.session.add(label)
         db.session.commit()
@@ -357,6 +502,10 @@ def edit_motif(id):
     label = MotifAndPattern.query.get_or_404(id)
     form = LabelForm(obj=label)
     if form.validate_on_submit():
+        existing = MotifAndPattern.lookup(form.name.data)
+        if existing and existing.id != label.id:
+            flash('图案标签已存在', 'error')
+            return render_template('label_form.html', form=form, title='修改图案标签')
         label.name = form.name.data
         label.description = form.description.data
         db.session.commit()
@@ -383,7 +532,7 @@ def delete_motif(id):
 @app.route('/labels_object_type')
 @login_required
 def labels_object_type():
-    labels = ObjectType.query.all()
+    labels = label_rows(ObjectType)
     return render_template('labels.html', items=labels, type='对象类型',
                            add_route='add_object_type', edit_route='edit_object_type', delete_route='delete_object_type')
 
@@ -395,6 +544,9 @@ def add_object_type():
         return redirect(url_for('index'))
     form = LabelForm()
     if form.validate_on_submit():
+        if ObjectType.lookup(form.name.data):
+            flash('对象类型已存在', 'error')
+            return render_template('label_form.html', form=form, title='添加对象类型')
         label = ObjectType(name=form.name.data)
         db.session.add(label)
         db.session.commit()
@@ -411,6 +563,10 @@ def edit_object_type(id):
     label = ObjectType.query.get_or_404(id)
     form = LabelForm(obj=label)
     if form.validate_on_submit():
+        existing = ObjectType.lookup(form.name.data)
+        if existing and existing.id != label.id:
+            flash('对象类型已存在', 'error')
+            return render_template('label_form.html', form=form, title='修改对象类型')
         label.name = form.name.data
         db.session.commit()
         flash('对象类型修改成功', 'success')
@@ -436,7 +592,7 @@ def delete_object_type(id):
 @app.route('/labels_form_structure')
 @login_required
 def labels_form_structure():
-    labels = FormAndStructure.query.all()
+    labels = label_rows(FormAndStructure)
     return render_template('labels.html', items=labels, type='形式结构',
                            add_route='add_form_structure', edit_route='edit_form_structure', delete_route='delete_form_structure')
 
@@ -448,6 +604,9 @@ def add_form_structure():
         return redirect(url_for('index'))
     form = LabelForm()
     if form.validate_on_submit():
+        if FormAndStructure.lookup(form.name.data):
+            flash('形式结构已存在', 'error')
+            return render_template('label_form.html', form=form, title='添加形式结构')
         label = FormAndStructure(name=form.name.data)
         db.session.add(label)
         db.session.commit()
@@ -464,6 +623,10 @@ def edit_form_structure(id):
     label = FormAndStructure.query.get_or_404(id)
     form = LabelForm(obj=label)
     if form.validate_on_submit():
+        existing = FormAndStructure.lookup(form.name.data)
+        if existing and existing.id != label.id:
+            flash('形式结构已存在', 'error')
+            return render_template('label_form.html', form=form, title='修改形式结构')
         label.name = form.name.data
         db.session.commit()
         flash('形式结构修改成功', 'success')
@@ -489,7 +652,7 @@ def delete_form_structure(id):
 @app.route('/categories')
 @login_required
 def categories():
-    items = Category.query.all()
+    items = label_rows(Category)
     return render_template('labels.html', items=items, type='Category',
                            add_route='add_category', edit_route='edit_category', delete_route='delete_category')
 
@@ -542,7 +705,7 @@ def delete_category(id):
 @app.route('/dynasties')
 @login_required
 def dynasties():
-    labels = Dynasty.query.all()
+    labels = label_rows(Dynasty)
     return render_template('labels.html', items=labels, type='朝代',
                            add_route='add_dynasty', edit_route='edit_dynasty', delete_route='delete_dynasty')
 
@@ -598,8 +761,130 @@ def logs():
     if current_user.role != 'admin':
         flash('无权限', 'error')
         return redirect(url_for('index'))
-    logs_list = Log.query.order_by(Log.timestamp.desc()).all()
-    return render_template('logs.html', logs=logs_list)
+    if request.args.get('source') == 'archive':
+        # 查询已归档到压缩文件中的日志
+        filters = _log_filters(request.args)
+        items = _archived_logs(filters, limit=500)
+        pagination = KeysetPage(items, 500, False, False, None, None, total=len(items))
+        return render_template('logs.html', logs=items, pagination=pagination,
+                               filters=dict(filters, source='archive'), source='archive')
+
+    query, filters = _filtered_logs(request.args)
+    pagination = keyset_paginate(
+        query.options(joinedload(Log.user)), (Log.timestamp, Log.id), per_page=50,
+        after=request.args.get('after'), before=request.args.get('before'),
+        count_mode='approx', count_cap=10000, descending=True, decode=_decode_log_cursor
+    )
+    return render_template('logs.html', logs=pagination.items, pagination=pagination,
+                           filters=filters, source='db')
+
+@app.route('/admin/logs/export.csv')
+@login_required
+def export_logs():
+    """按当前筛选条件流式导出 CSV，逐批读取，不会一次性加载全部日志"""
+    if current_user.role != 'admin':
+        abort(403)
+    if request.args.get('source') == 'archive':
+        rows = ((log.id, log.timestamp, log.table_name, log.record_id, log.action, log.user_id,
+                 log.user.username if log.user else None)
+                for log in _archived_logs(_log_filters(request.args)))
+    else:
+        query, _ = _filtered_logs(request.args)
+        rows = query.outerjoin(Log.user) \
+            .with_entities(Log.id, Log.timestamp, Log.table_name, Log.record_id, Log.action, Log.user_id, User.username) \
+            .order_by(Log.timestamp.desc(), Log.id.desc()) \
+            .yield_per(1000)
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id', 'timestamp', 'table_name', 'record_id', 'action', 'user_id', 'username'])
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=logs.csv'}
+    )
+
+def _log_filters(args):
+    """从请求参数中取出有效的日志筛选条件"""
+    filters = {}
+    for key in ('table_name', 'action'):
+        value = args.get(key, '').strip()
+        if value:
+            filters[key] = value
+    for key in ('user_id', 'record_id'):
+        value = args.get(key, type=int)
+        if value is not None:
+            filters[key] = value
+    for key in ('start', 'end'):
+        if _parse_datetime(args.get(key)) is not None:
+            filters[key] = args.get(key)
+    return filters
+
+def _filtered_logs(args):
+    """根据请求参数构造日志查询，返回 (查询, 生效的筛选条件)"""
+    filters = _log_filters(args)
+    query = Log.query
+    if 'table_name' in filters:
+        query = query.filter(Log.table_name == filters['table_name'])
+    if 'action' in filters:
+        # 前缀匹配：'bulk_create' 可匹配 'bulk_create 500'
+        query = query.filter(Log.action.startswith(filters['action'], autoescape=True))
+    if 'user_id' in filters:
+        query = query.filter(Log.user_id == filters['user_id'])
+    if 'record_id' in filters:
+        query = query.filter(Log.record_id == filters['record_id'])
+    if 'start' in filters:
+        query = query.filter(Log.timestamp >= _parse_datetime(filters['start']))
+    if 'end' in filters:
+        query = query.filter(Log.timestamp < _parse_datetime(filters['end']))
+    return query, filters
+
+def _archived_logs(filters, limit=None):
+    return query_archive(
+        app.config['LOG_ARCHIVE_DIR'],
+        start=_parse_datetime(filters.get('start')),
+        end=_parse_datetime(filters.get('end')),
+        table_name=filters.get('table_name'),
+        action=filters.get('action'),
+        user_id=filters.get('user_id'),
+        record_id=filters.get('record_id'),
+        limit=limit
+    )
+
+def _parse_datetime(value):
+    """解析 YYYY-MM-DD 或 YYYY-MM-DDTHH:MM，格式不对时忽略"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def _decode_log_cursor(values):
+    timestamp = _parse_datetime(values[0])
+    return [timestamp, values[1]] if timestamp else None
+
+@app.route('/admin/cache_stats')
+@login_required
+def cache_stats():
+    """缓存命中/未命中/淘汰计数（JSON）"""
+    if current_user.role != 'admin':
+        abort(403)
+    stats = get_cache().stats()
+    stats['museum_snapshot'] = {'version': museum_snapshot.version, 'rebuilds': museum_snapshot.rebuilds}
+    stats['user_cache'] = user_cache.stats()
+    stats['data_versions'] = data_versions.stats()
+    stats['templates'] = render_metrics.stats()
+    return jsonify(stats)
 
 # ==============================
 # 博物馆管理
@@ -612,15 +897,38 @@ def museums():
         flash('无权限访问', 'error')
         return redirect(url_for('index'))
     museums_list = Museum.query.order_by(Museum.name).all()
-    # 获取每个博物馆的文物数量
+    # 所有博物馆的文物数量及分布由一条 GROUP BY 查询得出（带缓存）
+    stats = cached_museum_stats()
     museums_with_count = []
     for museum in museums_list:
-        artifact_count = Artifact.query.filter_by(museum_id=museum.id).count()
+        museum_stats = stats.get(museum.id, EMPTY_STATS)
         museums_with_count.append({
             'museum': museum,
-            'artifact_count': artifact_count
+            'artifact_count': museum_stats.total,
+            'stats': museum_stats
         })
-    return render_template('museums.html', museums_with_count=museums_with_count)
+    delete_jobs = Job.query.filter_by(kind='museum_delete').order_by(Job.id.desc()).limit(10).all()
+    return render_template('museums.html', museums_with_count=museums_with_count, delete_jobs=delete_jobs)
+
+# 统计概览页中标签排行的种类与标题
+STATS_LABEL_KINDS = [('category', '类别'), ('dynasty', '朝代'), ('motif', '纹饰'),
+                     ('object_type', '器型'), ('form_structure', '形制')]
+
+@app.route('/admin/stats')
+@login_required
+def stats_overview():
+    if current_user.role != 'admin':
+        flash('无权限访问', 'error')
+        return redirect(url_for('index'))
+    days, top = 30, 10
+    # 汇总表中的数据都是预先累计好的小表，这里的查询不扫描 artifact / log 表
+    activity = {}
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    for row in daily_activity(start, table_name='Artifact'):
+        activity.setdefault(row.day, {})[row.action] = row.total
+    usage = {kind: label_usage(kind, limit=top) for kind, _ in STATS_LABEL_KINDS}
+    return render_template('stats.html', days=days, top=top, activity=sorted(activity.items(), reverse=True),
+                           usage=usage, kinds=STATS_LABEL_KINDS)
 
 @app.route('/admin/delete_museum/<int:id>', methods=['POST'])
 @login_required
@@ -656,28 +964,17 @@ def force_delete_museum(id):
         return redirect(url_for('index'))
     
     museum = Museum.query.get_or_404(id)
-    museum_name = museum.name
-    
-    try:
-        # 先删除该博物馆下的所有文物
-        artifacts = Artifact.query.filter_by(museum_id=id).all()
-        artifact_count = len(artifacts)
-        
-        for artifact in artifacts:
-            db.session.delete(artifact)
-        
-        # 然后删除博物馆
-        db.session.delete(museum)
-        db.session.commit()
-        
-        if artifact_count > 0:
-            flash(f'强制删除成功！已删除博物馆【{museum_name}】及其下的 {artifact_count} 件文物', 'success')
-        else:
-            flash(f'博物馆【{museum_name}】删除成功', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash(f'强制删除失败：{str(e)}', 'error')
-    
+
+    # 同一博物馆已有删除任务在进行时不重复提交
+    running = Job.query.filter(Job.kind == 'museum_delete', Job.museum_id == id,
+                               Job.state.in_(('pending', 'running'))).first()
+    if running:
+        flash(f'博物馆【{museum.name}】的删除任务 #{running.id} 正在进行中', 'info')
+        return redirect(url_for('museums'))
+
+    # 文物较多时删除耗时较长，交给后台任务分批删除
+    job = submit_museum_delete(app, id, user_id=current_user.id)
+    flash(f'已提交删除博物馆【{museum.name}】的任务 #{job.id}，可在下方查看进度', 'success')
     return redirect(url_for('museums'))
 
 # ==============================
@@ -728,172 +1025,85 @@ def import_data():
                 flash(f'未找到 {museum.name} 的默认文件，请手动上传', 'warning')
                 return redirect(request.url)
 
-        # ============ 读取并导入数据 ============
-        try:
-            df = pd.read_excel(file_path)
-        except Exception as e:
-            flash(f'读取文件失败：{str(e)}', 'error')
-            return redirect(request.url)
-
-        count = 0
-        for _, row in df.iterrows():
-            try:
-                # ========== 处理关联字段（自动创建或复用）==========
-
-                category_name = row.get('Category', '未知类别')
-                if pd.isna(category_name):
-                    category_name = '未知类别'
-                category = Category.query.filter_by(name=category_name).first() or Category(name=category_name)
-
-                dynasty_name = row.get('Dynasty', '未知朝代')
-                if pd.isna(dynasty_name):
-                    dynasty_name = '未知朝代'
-                dynasty = Dynasty.query.filter_by(name=dynasty_name).first() or Dynasty(name=dynasty_name)
-
-                image_url = row.get('Image') if pd.notna(row.get('Image')) else None
-                image = Image.query.filter_by(url=image_url).first() or (Image(url=image_url) if image_url else None)
-
-                motif_name = row.get('MotifAndPattern') if pd.notna(row.get('MotifAndPattern')) else None
-                motif = MotifAndPattern.query.filter_by(name=motif_name).first() or (MotifAndPattern(name=motif_name) if motif_name else None)
-
-                obj_type_name = row.get('ObjectType') if pd.notna(row.get('ObjectType')) else None
-                obj_type = ObjectType.query.filter_by(name=obj_type_name).first() or (ObjectType(name=obj_type_name) if obj_type_name else None)
-
-                form_struct_name = row.get('FormAndStructure') if pd.notna(row.get('FormAndStructure')) else None
-                form_struct = FormAndStructure.query.filter_by(name=form_struct_name).first() or (FormAndStructure(name=form_struct_name) if form_struct_name else None)
-
-                # ========== 特殊字段 ==========
-                description = row.get('Description') if pd.notna(row.get('Description')) else None
-
-                # ========== 添加到会话 ==========
-                db.session.add_all([category, dynasty])
-                if image: db.session.add(image)
-                if motif: db.session.add(motif)
-                if obj_type: db.session.add(obj_type)
-                if form_struct: db.session.add(form_struct)
-
-                # ========== 创建 Artifact ==========
-                artifact = Artifact(
-                    museum_id=museum.id,
-                    name=row['Name'],
-                    description=description,
-                    category_id=category.id,
-                    dynasty_id=dynasty.id,
-                    image_id=image.id if image else None,
-                    motif_id=motif.id if motif else None,
-                    object_type_id=obj_type.id if obj_type else None,
-                    form_structure_id=form_struct.id if form_struct else None
-                )
-
-                db.session.add(artifact)
-                count += 1
-                if(count%50==0): db.session.commit()
-
-            except Exception as e:
-                db.session.rollback()
-                flash(f'导入第 {count+1} 行失败：{str(e)}', 'warning')
-                continue
+        # ============ 提交后台导入任务 ============
+        job = submit_import(app, museum.id, file_path, user_id=current_user.id)
+        flash(f'已提交【{museum.name}】的导入任务 #{job.id}，可在下方查看进度', 'success')
+        return redirect(url_for('import_data'))
 
-        db.session.commit()
-        flash(f'成功为【{museum.name}】导入 {count} 条文物', 'success')
-        return redirect(url_for('artifacts', museum_id=museum.id))
+    # 导入完成后自动提交的图片预取任务也列在这里
+    jobs = Job.query.filter(Job.kind.in_(('import', 'image_prefetch'))).order_by(Job.id.desc()).limit(10).all()
+    return render_template('import.html', form=form, jobs=jobs)
 
-    return render_template('import.html', form=form)
+@app.route('/admin/import/jobs/<int:id>')
+@app.route('/admin/jobs/<int:id>')
+@login_required
+def import_job_status(id):
+    """后台任务进度（JSON），供 import.html、museums.html 轮询"""
+    if current_user.role != 'admin':
+        abort(403)
+    job = Job.query.get_or_404(id)
+    data = job.to_dict()
+    if job.museum_id and job.kind in ('import', 'image_prefetch'):
+        data['artifacts_url'] = url_for('artifacts', museum_id=job.museum_id)
+    return jsonify(data)
 
 # ==============================
 # 辅助函数
 # ==============================
 
-def _create_or_get_associated_records(form):
-    """自动创建或获取关联记录（类别、朝代、图片、标签等）"""
-    if form.category.data:
-        cat = Category.query.filter_by(name=form.category.data).first() or Category(name=form.category.data)
-        db.session.add(cat)
-    if form.dynasty.data:
-        dyn = Dynasty.query.filter_by(name=form.dynasty.data).first() or Dynasty(name=form.dynasty.data)
-        db.session.add(dyn)
-    if form.image_url.data:
-        img = Image.query.filter_by(url=form.image_url.data).first() or Image(url=form.image_url.data)
-        db.session.add(img)
-    if form.motif.data:
-        m = MotifAndPattern.query.filter_by(name=form.motif.data).first() or MotifAndPattern(name=form.motif.data)
-        db.session.add(m)
-    if form.object_type.data:
-        o = ObjectType.query.filter_by(name=form.object_type.data).first() or ObjectType(name=form.object_type.data)
-        db.session.add(o)
-    if form.form_structure.data:
-        f = FormAndStructure.query.filter_by(name=form.form_structure.data).first() or FormAndStructure(name=form.form_structure.data)
-        db.session.add(f)
-    db.session.commit()
+def _resolve_form_labels(form, labels):
+    """一轮解析（必要时创建）表单中的全部标签，返回 Artifact 外键字段 -> id"""
+    values = {column: (getattr(form, field).data or '').strip() or None
+              for field, column in LABEL_FIELDS.items()}
+    labels.resolve_all({column: {value} for column, value in values.items()})
+    return {LABEL_COLUMNS[column][2]: labels.id_of(column, value) for column, value in values.items()}
 
 from sqlalchemy.event import listens_for
-from flask_login import current_user
-from datetime import datetime
 
 # ==============================
-# 添加操作日志
+# flush 钩子：操作日志与缓存失效
 # ==============================
 
-# 临时存储待记录的日志信息
-_pending_logs = []
-
 @listens_for(db.session, 'before_flush')
 def before_flush(session, flush_context, instances):
-    """在 flush 之前收集需要记录日志的对象信息"""
-    models = {Artifact, Museum, Category, Dynasty, Image, 
-              MotifAndPattern, ObjectType, FormAndStructure, User}
-    
-    global _pending_logs
-    _pending_logs = []
-    
-    # 收集新创建的对象（此时 id 还没有，需要等到 after_flush_postexec）
-    for instance in session.new:
-        # 排除 Log 模型，避免记录日志时触发无限循环
-        if type(instance) in models and type(instance) != Log:
-            _pending_logs.append(('create', type(instance).__name__, None, instance))
-    
-    # 收集修改的对象（此时 id 已经有了）
-    for instance in session.dirty:
-        if type(instance) in models and type(instance) != Log and session.is_modified(instance):
-            if hasattr(instance, 'id') and instance.id:
-                _pending_logs.append(('update', type(instance).__name__, instance.id, None))
-    
-    # 收集删除的对象（此时 id 已经有了）
-    for instance in session.deleted:
-        if type(instance) in models and type(instance) != Log:
-            if hasattr(instance, 'id') and instance.id:
-                _pending_logs.append(('delete', type(instance).__name__, instance.id, None))
+    """在 flush 之前收集需要记录日志的对象信息，以及需要失效的缓存"""
+    collect_audit(session)
+
+    # 记录需要失效的缓存（按会话保存，flush 完成后统一失效）
+    session.info.setdefault('cache_tags', set()).update(collect_tags(session))
+    # 被修改的用户版本号加一，其他进程缓存的登录用户随之失效
+    bump_user_versions(session)
+
+    # 记录需要更新搜索索引的文物（提交后才写入索引）
+    collect_search(session)
+
+    # 记录统计汇总表的修改前状态
+    collect_stats(session)
 
 @listens_for(db.session, 'after_flush_postexec')
 def after_flush_postexec(session, flush_context):
-    """在 flush 完成后记录日志（此时所有对象的 id 都已经生成）"""
-    global _pending_logs
-    
-    for action, table_name, record_id, instance in _pending_logs:
-        # 如果是新创建的对象，从实例获取 id
-        if action == 'create' and instance is not None:
-            if hasattr(instance, 'id') and instance.id:
-                _auto_log(table_name, instance.id, action)
-        # 如果是更新或删除，使用已保存的 record_id
-        elif record_id is not None:
-            _auto_log(table_name, record_id, action)
-    
-    _pending_logs = []
-
-def _auto_log(table_name: str, record_id: int, action: str):
-    """记录操作日志"""
-    try:
-        user_id = current_user.id if current_user.is_authenticated else None
-
-        log = Log(
-            table_name=table_name,
-            record_id=record_id,
-            action=action[:255], 
-            user_id=user_id,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(log)
-        # 注意：这里不调用 commit，让调用者控制事务
-    except Exception as e:
-        # 如果记录日志失败，不影响主操作
-        pass
+    """在 flush 完成后批量写入日志（此时所有对象的 id 都已经生成）"""
+    write_audit(session)
+
+    tags = session.info.pop('cache_tags', ())
+    invalidate_tags(tags)
+    # 提交后再失效一次：提交前其他请求读到的仍是旧数据（角色/密码、文物列表等），
+    # 可能已按新的版本号重新写入缓存
+    session.info.setdefault('commit_tags', set()).update(tags)
+
+    resolve_search(session)
+
+    # 在同一事务中累加统计汇总表
+    apply_stats(session)
+
+@listens_for(db.session, 'after_commit')
+def after_commit(session):
+    commit_search(session)
+    invalidate_tags(session.info.pop('commit_tags', ()))
+
+@listens_for(db.session, 'after_soft_rollback')
+def after_soft_rollback(session, previous_transaction):
+    discard_audit(session)
+    discard_search(session)
+    discard_stats(session)
+    session.info.pop('commit_tags', None)
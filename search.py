@@ -0,0 +1,307 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Artifact
+from cache import data_versions
+from facets import FACETS, GLOBAL_FACETS, FacetValue
+
+# ==============================
+# 全文搜索（本地 SQLite FTS5 索引，无需外部搜索服务）
+# ==============================
+#
+# 索引保存在独立的 SQLite 文件中（SEARCH_INDEX_PATH），与主库 MySQL 无关。
+# 中文按相邻两字切分（bigram），英文/数字按单词切分，切好的词以空格连接后
+# 交给 FTS5 的 unicode61 分词器，因此两字及以上的中文词都能命中。
+# 文物的五个分面 id 与博物馆 id 作为 UNINDEXED 列一起存储，筛选和分面统计
+# 都在索引内完成，不回查主库。
+#
+# 增量更新：flush 钩子收集变动的文物 id（标签改名时收集引用它的文物），
+# 提交后写入索引库的 pending 表，并在后台任务队列中排一次同步（jobs.submit_search_refresh），
+# 从主库重新读取这些文物。批量导入等绕过 ORM 的写入则登记整个博物馆待重建。
+# 搜索请求只查询索引，不等待同步：刚提交的修改可能要稍后才能搜到。
+
+FACET_COLUMNS = [fk for _, fk in FACETS.values()]
+
+# 一次搜索最多返回的结果数（按相关度取前 N 条，再在内存中分页）
+SEARCH_RESULT_LIMIT = 1000
+
+_CJK = r'㐀-䶿一-鿿豈-﫿'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}]+', re.UNICODE)
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+_lock = threading.RLock()
+
+
+def tokenize(text):
+    """把文本切成词：中文两字一组（单字保留单字），其他按单词小写"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text or ''):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def build_match(query):
+    """把用户输入转成 FTS5 MATCH 表达式：所有词都要出现；单个汉字按前缀匹配"""
+    parts = []
+    for token in tokenize(query):
+        quoted = '"' + token.replace('"', '""') + '"'
+        parts.append(quoted + '*' if len(token) == 1 and _CJK_RE.match(token) else quoted)
+    return ' AND '.join(parts)
+
+
+class SearchIndex:
+    def __init__(self, path):
+        self.path = path
+
+    # ---------- 连接与建表 ----------
+
+    @contextmanager
+    def _connect(self):
+        """打开索引库，正常结束时提交，出错时回滚，最后总是关闭连接"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS artifact_fts USING fts5(
+                    name, body, museum_id UNINDEXED, {", ".join(f"{c} UNINDEXED" for c in FACET_COLUMNS)},
+                    tokenize = 'unicode61')''')
+                conn.execute('CREATE TABLE IF NOT EXISTS pending_artifact (id INTEGER PRIMARY KEY)')
+                conn.execute('CREATE TABLE IF NOT EXISTS pending_museum (id INTEGER PRIMARY KEY)')
+                conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- 写入 ----------
+
+    def mark_dirty(self, artifact_ids=(), museum_ids=()):
+        """登记待更新的文物/博物馆，真正的重建由后台任务完成（见 schedule_refresh）"""
+        if not artifact_ids and not museum_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany('INSERT OR IGNORE INTO pending_artifact (id) VALUES (?)',
+                             [(i,) for i in artifact_ids])
+            conn.executemany('INSERT OR IGNORE INTO pending_museum (id) VALUES (?)',
+                             [(i,) for i in museum_ids])
+
+    def rebuild(self, batch_size=2000):
+        """从主库全量重建索引，返回文档数"""
+        with _lock, self._connect() as conn:
+            conn.execute('DELETE FROM artifact_fts')
+            conn.execute('DELETE FROM pending_artifact')
+            conn.execute('DELETE FROM pending_museum')
+            total = self._index_rows(conn, _documents().order_by(Artifact.id), batch_size)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+        data_versions.bump({'search'})
+        return total
+
+    def refresh(self):
+        """处理待更新列表；索引从未建立时全量构建。在后台任务中运行，同一时间只有一个在写索引"""
+        with _lock:
+            with self._connect() as conn:
+                built, has_pending = self._state(conn)
+            if not built:
+                self.rebuild()
+            elif has_pending:
+                self._apply_pending()
+
+    def _apply_pending(self):
+        with _lock, self._connect() as conn:
+            museum_ids = [r[0] for r in conn.execute('SELECT id FROM pending_museum')]
+            artifact_ids = [r[0] for r in conn.execute('SELECT id FROM pending_artifact')]
+            for museum_id in museum_ids:
+                conn.execute('DELETE FROM artifact_fts WHERE museum_id = ?', (museum_id,))
+                self._index_rows(conn, _documents().where(Artifact.museum_id == museum_id))
+            for i in range(0, len(artifact_ids), 500):
+                chunk = artifact_ids[i:i + 500]
+                conn.executemany('DELETE FROM artifact_fts WHERE rowid = ?', [(a,) for a in chunk])
+                # 已删除的文物查不到，自然不会再写回索引
+                self._index_rows(conn, _documents().where(Artifact.id.in_(chunk)))
+            conn.executemany('DELETE FROM pending_museum WHERE id = ?', [(m,) for m in museum_ids])
+            conn.executemany('DELETE FROM pending_artifact WHERE id = ?', [(a,) for a in artifact_ids])
+        # 索引已提交：搜索结果页的 ETag 与渲染缓存随之失效（提交时的版本号早于索引同步）
+        data_versions.bump({'search'})
+
+    def _index_rows(self, conn, statement, batch_size=2000):
+        total = 0
+        result = db.session.execute(statement.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            conn.executemany(
+                f'INSERT OR REPLACE INTO artifact_fts (rowid, name, body, museum_id, {", ".join(FACET_COLUMNS)}) '
+                f'VALUES ({", ".join("?" * (4 + len(FACET_COLUMNS)))})',
+                [_document(row) for row in rows]
+            )
+            total += len(rows)
+        return total
+
+    @staticmethod
+    def _state(conn):
+        """(索引是否已建立, 是否有待更新的文物/博物馆)"""
+        built = conn.execute("SELECT value FROM meta WHERE key = 'built'").fetchone() is not None
+        has_pending = conn.execute(
+            'SELECT EXISTS(SELECT 1 FROM pending_artifact) OR EXISTS(SELECT 1 FROM pending_museum)'
+        ).fetchone()[0]
+        return built, bool(has_pending)
+
+    # ---------- 查询 ----------
+    #
+    # 查询不同步索引，只在发现索引未建立或有待更新内容时（例如命令行直接登记的修改）排一次后台同步，
+    # 本次先返回现有索引中的结果。
+
+    def _check_stale(self, conn):
+        built, has_pending = self._state(conn)
+        if not built or has_pending:
+            schedule_refresh()
+
+    def search(self, query, museum_id=None, filters=None, limit=SEARCH_RESULT_LIMIT):
+        """返回按相关度排序的文物 id 列表（名称命中权重高于描述/标签）"""
+        match = build_match(query)
+        if not match:
+            return []
+        where, params = self._where(match, museum_id, filters)
+        with self._connect() as conn:
+            self._check_stale(conn)
+            rows = conn.execute(
+                f'SELECT rowid FROM artifact_fts WHERE {where} '
+                f'ORDER BY bm25(artifact_fts, 10.0, 1.0) LIMIT ?',
+                params + [limit]
+            )
+            return [row[0] for row in rows]
+
+    def facet_counts(self, query, museum_id=None, filters=None, facets=FACETS):
+        """
+        在搜索结果范围内统计各分面的取值数量，结构与 facets.facet_counts 相同。
+        只做一次 MATCH，取出命中文档的各分面 id 后在内存中计数；
+        计算某个分面时同样忽略它自身的筛选条件。
+        """
+        match = build_match(query)
+        result = {key: [] for key in facets}
+        if not match:
+            return result
+        filters = filters or {}
+        columns = [GLOBAL_FACETS[key][1] for key in facets]
+        positions = {key: i for i, key in enumerate(facets)}
+        counts = {key: Counter() for key in facets}
+        where, params = self._where(match, museum_id, None)
+        with self._connect() as conn:
+            for row in conn.execute(f'SELECT {", ".join(columns)} FROM artifact_fts WHERE {where}', params):
+                failed = [key for key, value in filters.items() if row[positions[key]] != value]
+                if len(failed) > 1:
+                    continue
+                for key in facets:
+                    # 不满足的筛选条件最多只能是自身
+                    if (not failed or failed == [key]) and row[positions[key]] is not None:
+                        counts[key][row[positions[key]]] += 1
+
+        for key in facets:
+            model = GLOBAL_FACETS[key][0]
+            if counts[key]:
+                names = db.session.execute(
+                    select(model.id, model.name).where(model.id.in_(list(counts[key]))).order_by(model.name)
+                )
+                result[key] = [FacetValue(label_id, name, counts[key][label_id]) for label_id, name in names]
+        return result
+
+    @staticmethod
+    def _where(match, museum_id, filters, exclude=None):
+        where, params = ['artifact_fts MATCH ?'], [match]
+        if museum_id is not None:
+            where.append('museum_id = ?')
+            params.append(museum_id)
+        for key, value in (filters or {}).items():
+            if key != exclude:
+                where.append(f'{GLOBAL_FACETS[key][1]} = ?')
+                params.append(value)
+        return ' AND '.join(where), params
+
+
+def init_search(app):
+    app.extensions['search'] = SearchIndex(app.config.get('SEARCH_INDEX_PATH', 'search/artifacts.db'))
+
+
+def get_search_index():
+    return current_app.extensions['search']
+
+
+def schedule_refresh():
+    """在后台任务队列中同步索引（已有一次在排队时不重复提交）"""
+    from jobs import submit_search_refresh  # jobs 经 importer 依赖本模块，延迟导入
+    submit_search_refresh(current_app._get_current_object())
+
+
+# ---------- 增量更新（由 routes.py 中的 flush 钩子调用） ----------
+
+def collect_search(session):
+    """before_flush：记下本次涉及的文物，以及被改名/删除的标签所影响的文物"""
+    pending = session.info.setdefault('search_pending', set())
+    label_models = {model: fk for model, fk in FACETS.values()}
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Artifact):
+            # 新建文物此时还没有 id，先记下对象，flush 后再取
+            pending.add(instance)
+        elif type(instance) in label_models and instance not in session.new:
+            fk = label_models[type(instance)]
+            with session.no_autoflush:
+                ids = session.scalars(select(Artifact.id).where(getattr(Artifact, fk) == instance.id))
+                pending.update(ids)
+
+
+def resolve_search(session):
+    """after_flush_postexec：把对象换成 id，等待提交"""
+    pending = session.info.get('search_pending')
+    if pending:
+        session.info['search_pending'] = {
+            item.id if isinstance(item, Artifact) else item for item in pending
+        }
+
+
+def commit_search(session):
+    """after_commit：把待更新的文物写入索引库的 pending 表，并排一次后台同步"""
+    pending = session.info.pop('search_pending', None)
+    if pending:
+        get_search_index().mark_dirty(artifact_ids=[i for i in pending if i is not None])
+        schedule_refresh()
+
+
+def discard_search(session):
+    session.info.pop('search_pending', None)
+
+
+# ---------- 文档构造 ----------
+
+_LABEL_ALIASES = [(model.__table__.alias(f'{model.__tablename__}_label'), fk)
+                  for model, fk in FACETS.values()]
+
+
+def _documents():
+    """一条 SELECT 同时取出文物字段与五个标签名称（LEFT JOIN），用于构造索引文档"""
+    columns = [Artifact.id, Artifact.name, Artifact.description, Artifact.museum_id]
+    columns += [getattr(Artifact, fk) for fk in FACET_COLUMNS]
+    columns += [alias.c.name.label(f'{fk}_name') for alias, fk in _LABEL_ALIASES]
+    statement = select(*columns).select_from(Artifact)
+    for alias, fk in _LABEL_ALIASES:
+        statement = statement.outerjoin(alias, alias.c.id == getattr(Artifact, fk))
+    return statement
+
+
+def _document(row):
+    label_names = [getattr(row, f'{fk}_name') for _, fk in _LABEL_ALIASES]
+    body = ' '.join(filter(None, [row.description, *label_names]))
+    facet_ids = [getattr(row, fk) for fk in FACET_COLUMNS]
+    return [row.id, ' '.join(tokenize(row.name)), ' '.join(tokenize(body)), row.museum_id, *facet_ids]
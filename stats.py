@@ -0,0 +1,475 @@
+import random
+from collections import Counter, namedtuple
+from datetime import datetime, time
+
+from sqlalchemy import and_, bindparam, delete, func, inspect, insert, select, update
+
+from models import (
+    db, Artifact, Museum, Log,
+    Category, Dynasty, Image, MotifAndPattern, ObjectType, FormAndStructure,
+    ArtifactStat, LabelUsageStat, ActivityStat
+)
+from facets import FacetValue
+
+# ==============================
+# 博物馆统计：文物总数、有无图片、按类别/朝代分布
+# ==============================
+
+# 分布统计的维度：名称 -> (标签模型, Artifact 外键字段)
+BREAKDOWNS = {
+    'category': (Category, 'category_id'),
+    'dynasty': (Dynasty, 'dynasty_id'),
+}
+
+# 外键为空的文物在分布中显示的名称
+UNLABELED = '（未标注）'
+
+MuseumStats = namedtuple('MuseumStats', ['total', 'with_image', 'category', 'dynasty'])
+
+EMPTY_STATS = MuseumStats(0, 0, [], [])
+
+
+def stats_statement(museum_id=None):
+    """
+    直接在 artifact 表上统计：按 (博物馆, 类别, 朝代) 分组计数，
+    同时用 COUNT(image_id) 统计有图片的文物数。
+    页面读取的是汇总表 ArtifactStat，本查询用于重建与核对汇总表。
+    """
+    columns = [getattr(Artifact, fk) for _, fk in BREAKDOWNS.values()]
+    statement = select(
+        Artifact.museum_id, *columns,
+        func.count().label('total'),
+        func.count(Artifact.image_id).label('with_image')
+    )
+    if museum_id is not None:
+        statement = statement.where(Artifact.museum_id == museum_id)
+    return statement.group_by(Artifact.museum_id, *columns)
+
+
+def summary_statement(museum_id=None):
+    """从汇总表读取，列与 stats_statement 相同（外键 0 表示未标注）"""
+    statement = select(
+        ArtifactStat.museum_id, ArtifactStat.category_id, ArtifactStat.dynasty_id,
+        ArtifactStat.total, ArtifactStat.with_image
+    ).where(ArtifactStat.total > 0)
+    if museum_id is not None:
+        statement = statement.where(ArtifactStat.museum_id == museum_id)
+    return statement
+
+
+def compute_stats(museum_id=None):
+    """返回 {museum_id: MuseumStats}；museum_id 不为 None 时只统计该博物馆"""
+    totals = Counter()
+    with_image = Counter()
+    breakdowns = {key: {} for key in BREAKDOWNS}
+    for row in db.session.execute(summary_statement(museum_id)):
+        mid = row.museum_id
+        totals[mid] += row.total
+        with_image[mid] += row.with_image
+        for key, (_, fk) in BREAKDOWNS.items():
+            breakdowns[key].setdefault(mid, Counter())[getattr(row, fk) or None] += row.total
+
+    # 只查询实际出现过的标签名称
+    names = {}
+    for key, (model, _) in BREAKDOWNS.items():
+        ids = {label_id for counts in breakdowns[key].values() for label_id in counts if label_id is not None}
+        names[key] = dict(db.session.query(model.id, model.name).filter(model.id.in_(ids))) if ids else {}
+
+    return {
+        mid: MuseumStats(
+            total=totals[mid],
+            with_image=with_image[mid],
+            **{key: _facet_values(breakdowns[key][mid], names[key]) for key in BREAKDOWNS}
+        )
+        for mid in totals
+    }
+
+
+def _facet_values(counts, names):
+    """按数量从多到少排列，数量相同按名称"""
+    values = [FacetValue(label_id, names.get(label_id, UNLABELED) if label_id is not None else UNLABELED, count)
+              for label_id, count in counts.items()]
+    values.sort(key=lambda v: (-v.count, v.name))
+    return values
+
+
+def stats_dict(stats):
+    """供 JSON 接口输出"""
+    return {
+        'total': stats.total,
+        'with_image': stats.with_image,
+        'without_image': stats.total - stats.with_image,
+        **{key: [value._asdict() for value in getattr(stats, key)] for key in BREAKDOWNS},
+    }
+
+
+# ==============================
+# 汇总表的增量维护
+# ==============================
+#
+# 文物的增删改在 flush 钩子中换算成计数增量（新建 +1、删除 -1、修改为旧键 -1 新键 +1），
+# 在同一事务内用 UPDATE ... SET total = total + ? 累加到汇总表，随业务数据一起提交或回滚。
+# 不经过 ORM 的批量写入（导入、生成数据、强制删除）直接用 StatDelta 换算后累加。
+
+# 标签使用统计的种类 -> (标签模型, Artifact 外键字段)
+USAGE_KINDS = {
+    'category': (Category, 'category_id'),
+    'dynasty': (Dynasty, 'dynasty_id'),
+    'motif': (MotifAndPattern, 'motif_id'),
+    'object_type': (ObjectType, 'object_type_id'),
+    'form_structure': (FormAndStructure, 'form_structure_id'),
+    'image': (Image, 'image_id'),
+}
+
+# 影响统计的文物字段
+STAT_COLUMNS = ('museum_id', 'category_id', 'dynasty_id', 'image_id',
+                'motif_id', 'object_type_id', 'form_structure_id')
+
+# 标签模型 -> 种类
+USAGE_KIND_OF = {model: kind for kind, (model, _) in USAGE_KINDS.items()}
+
+ARTIFACT_STAT_KEYS = ('museum_id', 'category_id', 'dynasty_id')
+LABEL_USAGE_KEYS = ('kind', 'label_id')
+ACTIVITY_KEYS = ('day', 'table_name', 'action')
+
+# ActivityStat 每个 (日期, 表, 操作) 的分槽数：每次写日志都要累加当天的计数，
+# 不分槽时所有并发写入都在自己的事务里等待同一行的锁
+ACTIVITY_SLOTS = 8
+
+
+class StatDelta:
+    """一批文物变化换算出的计数增量"""
+
+    def __init__(self):
+        self.artifacts = {}         # (博物馆, 类别, 朝代) -> {'total': n, 'with_image': n}
+        self.labels = Counter()     # (种类, 标签 id) -> n
+
+    def add(self, row, sign=1):
+        """row 为包含 STAT_COLUMNS 的字典（缺少的字段视为空）"""
+        key = (row['museum_id'], row.get('category_id') or 0, row.get('dynasty_id') or 0)
+        counters = self.artifacts.setdefault(key, {'total': 0, 'with_image': 0})
+        counters['total'] += sign
+        if row.get('image_id'):
+            counters['with_image'] += sign
+        for kind, (_, fk) in USAGE_KINDS.items():
+            if row.get(fk):
+                self.labels[(kind, row[fk])] += sign
+
+    def add_rows(self, rows, sign=1):
+        for row in rows:
+            self.add(row, sign)
+        return self
+
+    def apply(self, connection=None):
+        connection = connection or db.session.connection()
+        _increment(connection, ArtifactStat, ARTIFACT_STAT_KEYS, self.artifacts)
+        _increment(connection, LabelUsageStat, LABEL_USAGE_KEYS,
+                   {key: {'total': n} for key, n in self.labels.items()})
+
+
+def _increment(connection, model, key_columns, deltas):
+    """
+    把 {键: {计数列: 增量}} 累加到汇总表：先 INSERT IGNORE 补齐不存在的行，
+    再用一条 executemany 的 UPDATE 累加。按键排序，使并发事务以相同顺序加锁。
+    """
+    from labels import insert_ignore  # labels -> audit -> stats，避免循环导入
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+    keys = sorted(deltas)
+    table = model.__table__
+    connection.execute(insert_ignore(model), [dict(zip(key_columns, key)) for key in keys])
+
+    counter_columns = list(deltas[keys[0]])
+    statement = update(table) \
+        .where(and_(*(table.c[k] == bindparam(f'key_{k}') for k in key_columns))) \
+        .values({c: table.c[c] + bindparam(f'delta_{c}') for c in counter_columns})
+    connection.execute(statement, [
+        {**{f'key_{k}': v for k, v in zip(key_columns, key)},
+         **{f'delta_{c}': deltas[key][c] for c in counter_columns}}
+        for key in keys
+    ])
+
+
+def _stat_attrs():
+    """影响统计的属性：外键列，以及通过它们设置外键的关系（如 artifact.image = Image(...)，外键在 flush 时才填入）"""
+    mapper = inspect(Artifact)
+    relations = [rel.key for rel in mapper.relationships
+                 if any(column.key in STAT_COLUMNS for column in rel.local_columns)]
+    return STAT_COLUMNS + tuple(relations)
+
+
+_STAT_ATTRS = _stat_attrs()
+
+
+def _row(instance):
+    return {column: getattr(instance, column) for column in STAT_COLUMNS}
+
+
+def _committed_row(instance):
+    """修改前的字段值；某个字段修改前未加载过时返回 None，由调用方查库"""
+    state = inspect(instance)
+    row = {}
+    for column in STAT_COLUMNS:
+        history = state.attrs[column].history
+        if history.deleted:
+            row[column] = history.deleted[0]
+        elif history.unchanged:
+            row[column] = history.unchanged[0]
+        elif not history.added:
+            row[column] = getattr(instance, column)   # 未加载：此时从数据库读到的就是原值
+        else:
+            return None
+    return row
+
+
+def collect_stats(session):
+    """
+    before_flush：记下修改前的统计键。
+    新建文物的外键可能要到 flush 时才由关系属性填入，新值统一在 flush 之后读取。
+    """
+    pending = session.info.setdefault('stats_pending', {
+        'new': [], 'dirty': [], 'deleted': [], 'labels': set(), 'museums': set()
+    })
+    unknown = []
+    with session.no_autoflush:
+        for instance in session.new:
+            if isinstance(instance, Artifact):
+                pending['new'].append(instance)
+        for instance in session.dirty:
+            if not isinstance(instance, Artifact):
+                continue
+            state = inspect(instance)
+            if not any(state.attrs[attr].history.has_changes() for attr in _STAT_ATTRS):
+                continue
+            old = _committed_row(instance)
+            if old is None:
+                unknown.append(instance)
+            else:
+                pending['dirty'].append((instance, old))
+        for instance in session.deleted:
+            if isinstance(instance, Artifact):
+                pending['deleted'].append(_committed_row(instance) or _row(instance))
+            elif type(instance) in USAGE_KIND_OF:
+                pending['labels'].add((USAGE_KIND_OF[type(instance)], instance.id))
+            elif isinstance(instance, Museum):
+                pending['museums'].add(instance.id)
+
+        if unknown:
+            columns = [getattr(Artifact, column) for column in STAT_COLUMNS]
+            rows = session.execute(select(Artifact.id, *columns)
+                                   .where(Artifact.id.in_([i.id for i in unknown])))
+            old_rows = {row.id: {column: getattr(row, column) for column in STAT_COLUMNS} for row in rows}
+            pending['dirty'].extend((i, old_rows[i.id]) for i in unknown if i.id in old_rows)
+
+
+def apply_stats(session):
+    """after_flush_postexec：换算增量并在当前事务中累加到汇总表"""
+    pending = session.info.pop('stats_pending', None)
+    if not pending:
+        return
+    connection = session.connection()
+    delta = StatDelta()
+    for instance in pending['new']:
+        delta.add(_row(instance), 1)
+    for instance, old in pending['dirty']:
+        new = _row(instance)
+        if new != old:
+            delta.add(old, -1)
+            delta.add(new, 1)
+    delta.add_rows(pending['deleted'], -1)
+    delta.apply(connection)
+
+    # 标签被删除：文物上的外键已被置空，相关行按博物馆重算
+    if pending['labels']:
+        museum_ids = set()
+        for kind, label_id in pending['labels']:
+            connection.execute(delete(LabelUsageStat).where(
+                LabelUsageStat.kind == kind, LabelUsageStat.label_id == label_id))
+            if kind in BREAKDOWNS:
+                column = getattr(ArtifactStat, BREAKDOWNS[kind][1])
+                museum_ids.update(connection.execute(
+                    select(ArtifactStat.museum_id).where(column == label_id).distinct()).scalars())
+        if museum_ids:
+            refresh_artifact_stats(connection, museum_ids)
+    if pending['museums']:
+        connection.execute(delete(ArtifactStat).where(ArtifactStat.museum_id.in_(pending['museums'])))
+
+
+def discard_stats(session):
+    session.info.pop('stats_pending', None)
+
+
+def refresh_artifact_stats(connection, museum_ids):
+    """按博物馆从 artifact 表重算 ArtifactStat"""
+    museum_ids = list(museum_ids)
+    connection.execute(delete(ArtifactStat).where(ArtifactStat.museum_id.in_(museum_ids)))
+    statement = stats_statement().where(Artifact.museum_id.in_(museum_ids))
+    rows = [_artifact_stat_row(row) for row in connection.execute(statement)]
+    if rows:
+        connection.execute(insert(ArtifactStat), rows)
+
+
+def _artifact_stat_row(row):
+    return {'museum_id': row.museum_id, 'category_id': row.category_id or 0,
+            'dynasty_id': row.dynasty_id or 0, 'total': row.total, 'with_image': row.with_image}
+
+
+# ---------- 操作量（按天） ----------
+
+def _activity_action(action):
+    """'create' -> ('create', 1)；'bulk_create 500' -> ('create', 500)"""
+    name, _, count = action.partition(' ')
+    return name.removeprefix('bulk_'), int(count) if count.isdigit() else 1
+
+
+def record_activity(connection, logs):
+    """写入操作日志的同时累加 ActivityStat；logs 为含 timestamp/table_name/action 的字典"""
+    totals = Counter()
+    slot = random.randrange(ACTIVITY_SLOTS)   # 同一批写入同一个槽，加锁顺序仍按键排序
+    for log in logs:
+        action, count = _activity_action(log['action'])
+        totals[(log['timestamp'].date(), log['table_name'], action, slot)] += count
+    _increment(connection, ActivityStat, ACTIVITY_KEYS + ('slot',),
+               {key: {'total': n} for key, n in totals.items()})
+
+
+# ==============================
+# 汇总表的重算与核对
+# ==============================
+
+def recompute(archive_dir=None):
+    """
+    从原始数据重新计算三张汇总表应有的内容：{表名: {键: {计数列: 值}}}。
+    操作量只能从仍在 log 表中的日志重算，起点为最早一条日志所在的日期
+    （当天已归档的部分从 archive_dir 补上；log 表为空时为最后一条归档日志所在的日期）；
+    更早的日期保持原值，返回值中的 since 即此日期。
+    """
+    artifacts = {}
+    for row in db.session.execute(stats_statement()):
+        stat = _artifact_stat_row(row)
+        key = tuple(stat[k] for k in ARTIFACT_STAT_KEYS)
+        counters = artifacts.setdefault(key, {'total': 0, 'with_image': 0})
+        counters['total'] += stat['total']
+        counters['with_image'] += stat['with_image']
+
+    labels = {}
+    for kind, (_, fk) in USAGE_KINDS.items():
+        column = getattr(Artifact, fk)
+        for label_id, total in db.session.execute(
+                select(column, func.count()).where(column.isnot(None)).group_by(column)):
+            labels[(kind, label_id)] = {'total': total}
+
+    activity, since = _recompute_activity(archive_dir)
+    return {'artifact': artifacts, 'label_usage': labels, 'activity': activity}, since
+
+
+def _recompute_activity(archive_dir):
+    first = db.session.execute(select(func.min(Log.timestamp))).scalar()
+    if first is not None:
+        since = first.date()
+    else:
+        # log 表为空（例如已全部归档）：从最后一条归档日志所在的日期起用归档重算；
+        # 没有归档时只核对今天
+        from retention import latest_archived
+        last = latest_archived(archive_dir) if archive_dir else None
+        since = (last or datetime.utcnow()).date()
+    totals = Counter()
+
+    seen = set()
+    for log_id, timestamp, table_name, action in db.session.execute(
+            select(Log.id, Log.timestamp, Log.table_name, Log.action)):
+        seen.add((log_id, timestamp))
+        action, count = _activity_action(action)
+        totals[(timestamp.date(), table_name, action)] += count
+
+    if archive_dir:
+        from retention import query_archive
+        # 归档与删除之间中断时，同一条日志可能同时在归档和 log 表中，按 (id, 时间) 去重
+        # （log 表清空后 id 可能被重新使用，只比较 id 不可靠）
+        for record in query_archive(archive_dir, start=datetime.combine(since, time.min)):
+            if (record.id, record.timestamp) not in seen:
+                action, count = _activity_action(record.action)
+                totals[(record.timestamp.date(), record.table_name, action)] += count
+
+    return {key: {'total': n} for key, n in totals.items()}, since
+
+
+def materialized(since=None):
+    """读取汇总表当前内容（忽略计数为 0 的行），格式与 recompute 相同"""
+    artifacts = {
+        (row.museum_id, row.category_id, row.dynasty_id): {'total': row.total, 'with_image': row.with_image}
+        for row in db.session.execute(select(ArtifactStat)).scalars()
+        if row.total or row.with_image
+    }
+    labels = {
+        (row.kind, row.label_id): {'total': row.total}
+        for row in db.session.execute(select(LabelUsageStat)).scalars() if row.total
+    }
+    activity = {
+        (row.day, row.table_name, row.action): {'total': row.total}
+        for row in daily_activity(since)
+    }
+    return {'artifact': artifacts, 'label_usage': labels, 'activity': activity}
+
+
+def diff_stats(expected, actual):
+    """返回 [(表名, 键, 应有值, 实际值)]"""
+    mismatches = []
+    for name in expected:
+        for key in sorted(set(expected[name]) | set(actual[name]), key=repr):
+            want, got = expected[name].get(key), actual[name].get(key)
+            if want != got:
+                mismatches.append((name, key, want, got))
+    return mismatches
+
+
+def rebuild_stats(archive_dir=None):
+    """清空汇总表并按 recompute 的结果重新写入（在一个事务中完成）"""
+    expected, since = recompute(archive_dir)
+    db.session.execute(delete(ArtifactStat))
+    db.session.execute(delete(LabelUsageStat))
+    db.session.execute(delete(ActivityStat).where(ActivityStat.day >= since))
+    for model, key_columns, name in ((ArtifactStat, ARTIFACT_STAT_KEYS, 'artifact'),
+                                     (LabelUsageStat, LABEL_USAGE_KEYS, 'label_usage'),
+                                     (ActivityStat, ACTIVITY_KEYS, 'activity')):
+        rows = [dict(zip(key_columns, key), **counters) for key, counters in expected[name].items()]
+        if rows:
+            db.session.execute(insert(model), rows)
+    db.session.commit()
+    return {name: len(rows) for name, rows in expected.items()}
+
+
+# ==============================
+# 汇总表的读取
+# ==============================
+
+LabelUsage = namedtuple('LabelUsage', ['id', 'name', 'count'])
+
+
+def label_usage(kind, limit=None):
+    """某类标签按使用次数从多到少排列"""
+    model, _ = USAGE_KINDS[kind]
+    name = model.url if model is Image else model.name
+    query = db.session.query(model.id, name, LabelUsageStat.total) \
+        .join(LabelUsageStat, and_(LabelUsageStat.kind == kind, LabelUsageStat.label_id == model.id)) \
+        .filter(LabelUsageStat.total > 0) \
+        .order_by(LabelUsageStat.total.desc(), model.id)
+    if limit:
+        query = query.limit(limit)
+    return [LabelUsage(*row) for row in query]
+
+
+def daily_activity(start=None, table_name=None, action=None):
+    """按天的操作量（各槽之和），日期倒序"""
+    total = func.sum(ActivityStat.total).label('total')
+    query = db.session.query(ActivityStat.day, ActivityStat.table_name, ActivityStat.action, total)
+    if start is not None:
+        query = query.filter(ActivityStat.day >= start)
+    if table_name:
+        query = query.filter(ActivityStat.table_name == table_name)
+    if action:
+        query = query.filter(ActivityStat.action == action)
+    return query.group_by(ActivityStat.day, ActivityStat.table_name, ActivityStat.action) \
+        .having(total > 0) \
+        .order_by(ActivityStat.day.desc(), ActivityStat.table_name, ActivityStat.action).all()
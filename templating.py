@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+from flask import before_render_template, template_rendered, g
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import get_cache, data_versions
+
+# ==============================
+# 模板：字节码缓存、片段缓存与渲染耗时统计
+# ==============================
+#
+# 字节码缓存：编译后的模板保存在 TEMPLATE_CACHE_DIR，进程重启后直接加载，不再解析模板源码；
+# 启动时预编译全部模板（TEMPLATE_PRECOMPILE），第一个请求也不用等待编译。
+#
+# 片段缓存：{% cache key[, ttl] %}...{% endcache %} 把块内的渲染结果存入应用缓存。
+# key 中应包含所依赖数据的版本号（模板中用 versions('facets:1', 'labels') 取得，见 cache.DataVersions），
+# 数据变化后键随之改变，修改立即可见，旧片段等待过期或被 LRU 淘汰。
+
+
+def _freeze(value):
+    """把 key 转成可哈希的形式（模板中的列表、字典）"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache key[, ttl] %}：ttl 省略时使用缓存的默认过期时间"""
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache_support', args), [], [], body).set_lineno(lineno)
+
+    def _cache_support(self, key, ttl, caller):
+        key = _freeze(key)
+        cache = get_cache()
+        html = cache.get(('fragment', key))
+        render_metrics.fragment(key[0] if isinstance(key, tuple) else key, html is not None)
+        if html is None:
+            html = caller()
+            cache.set(('fragment', key), html, ttl=ttl)
+        return Markup(html)
+
+
+class RenderMetrics:
+    """按模板统计 render_template 的次数与耗时（含嵌套渲染），以及各片段缓存的命中情况"""
+
+    def __init__(self):
+        self._templates = {}   # 模板名 -> [次数, 总耗时, 最大耗时]
+        self._fragments = {}   # 片段名 -> [命中, 未命中]
+        self._lock = threading.Lock()
+
+    def started(self, sender, template, context, **extra):
+        g.setdefault('render_started', []).append(time.perf_counter())
+
+    def finished(self, sender, template, context, **extra):
+        stack = g.get('render_started')
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        with self._lock:
+            counters = self._templates.setdefault(template.name, [0, 0.0, 0.0])
+            counters[0] += 1
+            counters[1] += elapsed
+            counters[2] = max(counters[2], elapsed)
+
+    def fragment(self, name, hit):
+        with self._lock:
+            counters = self._fragments.setdefault(name, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'templates': {
+                    name: {'renders': n, 'total_ms': round(total * 1000, 2),
+                           'avg_ms': round(total * 1000 / n, 2), 'max_ms': round(peak * 1000, 2)}
+                    for name, (n, total, peak) in sorted(self._templates.items())
+                },
+                'fragments': {
+                    name: {'hits': hits, 'misses': misses}
+                    for name, (hits, misses) in sorted(self._fragments.items())
+                },
+            }
+
+
+render_metrics = RenderMetrics()
+
+
+def precompile_templates(app):
+    """编译全部模板（写入字节码缓存并留在内存中），返回模板数"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def init_templating(app):
+    env = app.jinja_env
+    env.add_extension(FragmentCacheExtension)
+    env.globals['versions'] = data_versions.stamp
+
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR', 'instance/jinja')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    before_render_template.connect(render_metrics.started, app)
+    template_rendered.connect(render_metrics.finished, app)
+
+    if app.config.get('TEMPLATE_PRECOMPILE', 1):
+        try:
+            precompile_templates(app)
+        except OSError as e:
+            # 缓存目录不可写时照常运行，只是每次启动重新编译
+            app.logger.warning('模板预编译失败：%s', e)
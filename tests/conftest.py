@@ -0,0 +1,46 @@
+"""测试公共配置：使用临时 SQLite 数据库与临时目录启动应用，不影响正式数据"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TMP = tempfile.mkdtemp(prefix='museum-tests-')
+
+# 必须在导入 app 之前设置，配置在导入时读取
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP, 'test.db')
+os.environ['SECRET_KEY'] = 'test'
+os.environ['SEARCH_INDEX_PATH'] = os.path.join(_TMP, 'search.db')
+os.environ['IMAGE_STORE_DIR'] = os.path.join(_TMP, 'images')
+os.environ['TEMPLATE_CACHE_DIR'] = os.path.join(_TMP, 'jinja')
+os.environ['LOG_RETENTION_INTERVAL'] = '0'
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import app
+    from models import db
+    from jobs import shutdown_jobs
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, LOG_ARCHIVE_DIR=str(tmp_path / 'archive'))
+    with app.app_context():
+        db.create_all()
+        yield app
+        shutdown_jobs()   # 等待后台的搜索索引同步结束再删表
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """已登录的普通用户"""
+    from models import db, User
+    user = User(username='viewer')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'viewer', 'password': 'secret'})
+    client.get('/')   # 取走“登录成功”提示，否则列表页不带 ETag
+    return client
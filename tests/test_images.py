@@ -0,0 +1,133 @@
+"""图片缓存：只保存、只提供图片类型的原图"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+
+import pytest
+
+from images import PILImage, ImageStore, fetch_url, is_image_type
+from models import db, Image, url_digest
+
+
+def _png():
+    if PILImage is None:
+        return b'\x89PNG\r\n\x1a\n'   # 未安装 Pillow 时不解码，只原样保存
+    buffer = BytesIO()
+    PILImage.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+PNG = _png()
+
+
+def fake_fetcher(responses):
+    def fetch(url, timeout=None, max_bytes=None, allowed_hosts=()):
+        return responses[url]
+    return fetch
+
+
+def test_is_image_type():
+    assert is_image_type('image/jpeg')
+    assert is_image_type('IMAGE/PNG')
+    assert not is_image_type('text/html')
+    assert not is_image_type('image/svg+xml')
+    assert not is_image_type(None)
+
+
+def test_non_image_response_is_recorded_as_error(tmp_path):
+    store = ImageStore(str(tmp_path), fetcher=fake_fetcher({
+        'http://example.com/a.jpg': (b'<script>alert(1)</script>', 'text/html'),
+        'http://example.com/b.svg': (b'<svg onload="alert(1)"/>', 'image/svg+xml'),
+    }))
+    for url in ('http://example.com/a.jpg', 'http://example.com/b.svg'):
+        entry = store.ensure(url)
+        assert 'digest' not in entry and '不是图片' in entry['error']
+        assert not store.is_ready(url)
+    assert not (tmp_path / 'originals').exists()
+
+
+def test_legacy_non_image_entry_is_refetched(tmp_path):
+    url = 'http://example.com/c.png'
+    store = ImageStore(str(tmp_path), fetcher=fake_fetcher({url: (PNG, 'image/png')}))
+    # 早期版本缓存的 HTML 原图：视同未下载
+    path = tmp_path / 'urls' / url_digest(url)[:2] / f'{url_digest(url)}.json'
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({'url': url, 'digest': 'x' * 64, 'content_type': 'text/html'}))
+    assert store.needs_fetch(url) and not store.is_ready(url)
+
+    entry = store.ensure(url)
+    assert entry['content_type'] == 'image/png' and store.is_ready(url)
+
+
+def test_variant_route_only_serves_images(app, client):
+    image, page = Image(url='http://example.com/ok.png'), Image(url='http://example.com/page.png')
+    db.session.add_all([image, page])
+    db.session.commit()
+
+    store = app.extensions['images'].store
+    original_fetcher = store.fetcher
+    store.fetcher = fake_fetcher({image.url: (PNG, 'image/png'), page.url: (b'<html></html>', 'text/html')})
+    try:
+        store.ensure(image.url)
+        store.ensure(page.url)
+    finally:
+        store.fetcher = original_fetcher
+
+    response = client.get(f'/images/{image.id}/thumb')
+    assert response.status_code == 200
+    assert response.mimetype in ('image/png', 'image/jpeg')   # 安装 Pillow 时为缩略图
+    assert response.headers['X-Content-Type-Options'] == 'nosniff'
+
+    # 非图片内容不从本站提供，仍跳转到原地址
+    response = client.get(f'/images/{page.id}/thumb')
+    assert response.status_code == 302 and response.location == page.url
+
+
+@pytest.fixture
+def local_server():
+    """本机 HTTP 服务：/img 返回图片，/redirect?to=... 跳转"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/redirect?to='):
+                self.send_response(302)
+                self.send_header('Location', self.path[len('/redirect?to='):])
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.end_headers()
+            self.wfile.write(PNG)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/a.png',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://10.0.0.1/a.png',
+    'http://[::1]/a.png',
+    'http://[::ffff:127.0.0.1]/a.png',
+    'file:///etc/passwd',
+])
+def test_fetch_url_rejects_internal_addresses(url):
+    with pytest.raises(ValueError):
+        fetch_url(url, timeout=1)
+
+
+def test_fetch_url_allowed_hosts_and_redirects(local_server):
+    with pytest.raises(ValueError):
+        fetch_url(local_server + '/img')
+    assert fetch_url(local_server + '/img', allowed_hosts=['127.0.0.1']) == (PNG, 'image/png')
+
+    # 从允许的主机跳转到其他内网地址、或跳转到非 http 协议，同样拒绝
+    for target in ('http://localhost:1/img', 'ftp://127.0.0.1/img'):
+        with pytest.raises(ValueError):
+            fetch_url(f'{local_server}/redirect?to={target}', allowed_hosts=['127.0.0.1'])
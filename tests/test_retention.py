@@ -0,0 +1,49 @@
+"""操作日志归档：多次归档后仍能查到全部日志"""
+from datetime import datetime, timedelta
+
+from models import db, Log
+from retention import archive_logs, query_archive
+
+
+def add_logs(count, start):
+    db.session.add_all([
+        Log(table_name='Artifact', record_id=i, action='create', timestamp=start + timedelta(seconds=i))
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def test_archive_twice_with_reused_ids(app):
+    archive_dir = app.config['LOG_ARCHIVE_DIR']
+    add_logs(6, datetime(2024, 1, 1))
+    first_ids = {log.id for log in Log.query}
+    assert archive_logs(archive_dir, older_than_days=0) == 6
+
+    # log 表清空后 SQLite 从头分配 id
+    add_logs(10, datetime(2024, 2, 1))
+    assert {log.id for log in Log.query} & first_ids
+    assert archive_logs(archive_dir, older_than_days=0) == 10
+
+    records = query_archive(archive_dir)
+    assert len(records) == 16
+    assert len(query_archive(archive_dir, start=datetime(2024, 2, 1))) == 10
+
+
+def test_interrupted_archive_is_not_double_counted(app, monkeypatch):
+    archive_dir = app.config['LOG_ARCHIVE_DIR']
+    add_logs(4, datetime(2024, 1, 1))
+
+    # 写完归档后删除失败：下次运行会再归档一遍同样的日志
+    def fail(*args, **kwargs):
+        raise RuntimeError('中断')
+    monkeypatch.setattr(db.session, 'commit', fail)
+    try:
+        archive_logs(archive_dir, older_than_days=0)
+    except RuntimeError:
+        pass
+    monkeypatch.undo()
+    db.session.rollback()
+    assert Log.query.count() == 4
+
+    archive_logs(archive_dir, older_than_days=0)
+    assert len(query_archive(archive_dir)) == 4
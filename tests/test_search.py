@@ -0,0 +1,69 @@
+"""全文搜索：请求中只查询索引，同步交给后台任务"""
+import jobs
+from models import db, Museum, Artifact
+from search import get_search_index
+
+
+def test_commit_schedules_refresh_instead_of_search(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(jobs, 'submit_search_refresh', calls.append)
+    index = get_search_index()
+    index.rebuild()
+
+    museum = Museum(name='测试博物馆')
+    db.session.add(museum)
+    db.session.flush()
+    artifact = Artifact(museum_id=museum.id, name='青铜鼎')
+    db.session.add(artifact)
+    db.session.commit()
+    assert calls == [app]
+
+    # 搜索不同步索引：先返回旧结果，只再排一次同步
+    assert index.search('青铜') == []
+    assert len(calls) == 2
+
+    jobs._refresh_search(app)
+    assert index.search('青铜') == [artifact.id]
+    assert index.facet_counts('青铜', museum_id=museum.id)['category'] == []
+    assert len(calls) == 2
+
+
+def test_refresh_is_queued_once(app, monkeypatch):
+    submitted = []
+
+    class Executor:
+        def submit(self, *args):
+            submitted.append(args)
+
+    monkeypatch.setattr(jobs, '_get_executor', lambda app: Executor())
+    monkeypatch.setattr(jobs, '_search_refresh_queued', False)
+    jobs.submit_search_refresh(app)
+    jobs.submit_search_refresh(app)
+    assert len(submitted) == 1
+
+    # 开始执行后再登记的修改会重新排队
+    jobs._refresh_search(app)
+    jobs.submit_search_refresh(app)
+    assert len(submitted) == 2
+
+
+def test_search_page_changes_after_index_sync(app, client, monkeypatch):
+    monkeypatch.setattr(jobs, 'submit_search_refresh', lambda app: None)
+    app.config['ARTIFACT_FRAGMENT_TTL'] = 60
+    get_search_index().rebuild()
+    museum = Museum(name='测试博物馆')
+    db.session.add(museum)
+    db.session.commit()
+    db.session.add(Artifact(museum_id=museum.id, name='青铜犀尊'))
+    db.session.commit()
+
+    # 提交之后、索引同步之前的请求：结果是旧的
+    url = f'/artifacts/{museum.id}?q=青铜'
+    stale = client.get(url)
+    assert '青铜犀尊' not in stale.get_data(as_text=True)
+
+    jobs._refresh_search(app)
+    response = client.get(url, headers={'If-None-Match': stale.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != stale.headers['ETag']
+    assert '青铜犀尊' in response.get_data(as_text=True)
@@ -0,0 +1,120 @@
+"""统计汇总表：经 flush 钩子增量维护的结果应与从头重算的结果一致"""
+from models import db, Museum, Artifact, Category, Dynasty, Image, Log, ActivityStat
+from stats import ACTIVITY_SLOTS, recompute, materialized, diff_stats, rebuild_stats, daily_activity
+from retention import archive_logs
+
+
+def assert_consistent(app):
+    expected, since = recompute(app.config['LOG_ARCHIVE_DIR'])
+    assert diff_stats(expected, materialized(since)) == []
+
+
+def make_artifacts(count=5):
+    museum = Museum(name='测试博物馆')
+    bronze, jade = Category(name='青铜器'), Category(name='玉器')
+    shang = Dynasty(name='商')
+    db.session.add_all([museum, bronze, jade, shang])
+    db.session.flush()
+    artifacts = [
+        Artifact(museum_id=museum.id, name=f'文物{i}', category_id=bronze.id if i % 2 else jade.id,
+                 dynasty_id=shang.id if i % 3 else None,
+                 image=Image(url=f'http://example.com/{i}.jpg') if i % 2 else None)
+        for i in range(count)
+    ]
+    db.session.add_all(artifacts)
+    db.session.commit()
+    return museum, artifacts, (bronze, jade, shang)
+
+
+def test_create_update_delete(app):
+    museum, artifacts, (bronze, jade, shang) = make_artifacts()
+    assert_consistent(app)
+
+    artifacts[0].category_id = bronze.id
+    artifacts[1].dynasty_id = None
+    artifacts[2].image = Image(url='http://example.com/new.jpg')
+    artifacts[3].name = '只改名称'
+    db.session.commit()
+    assert_consistent(app)
+
+    db.session.delete(artifacts[4])
+    db.session.commit()
+    assert_consistent(app)
+
+
+def test_move_between_museums(app):
+    museum, artifacts, _ = make_artifacts()
+    other = Museum(name='另一博物馆')
+    db.session.add(other)
+    db.session.flush()
+    artifacts[0].museum_id = other.id
+    db.session.commit()
+    assert_consistent(app)
+
+
+def test_label_and_museum_delete(app):
+    museum, artifacts, (bronze, jade, shang) = make_artifacts()
+    db.session.delete(shang)
+    db.session.commit()
+    assert_consistent(app)
+
+    for artifact in Artifact.query.filter_by(museum_id=museum.id):
+        db.session.delete(artifact)
+    db.session.delete(museum)
+    db.session.commit()
+    assert_consistent(app)
+
+
+def test_rollback_leaves_stats_unchanged(app):
+    museum, artifacts, (bronze, jade, shang) = make_artifacts()
+    artifacts[0].category_id = None
+    db.session.flush()
+    db.session.rollback()
+    assert_consistent(app)
+
+
+def test_all_logs_archived(app):
+    make_artifacts()
+    archive_logs(app.config['LOG_ARCHIVE_DIR'], older_than_days=0)
+    assert Log.query.count() == 0
+    assert_consistent(app)
+
+    # 归档后继续写入，再重建一次
+    Artifact.query.first().name = '归档后修改'
+    db.session.commit()
+    assert_consistent(app)
+    rebuild_stats(app.config['LOG_ARCHIVE_DIR'])
+    assert_consistent(app)
+
+
+def test_archived_twice_with_reused_log_ids(app):
+    museum, artifacts, (bronze, jade, shang) = make_artifacts()
+    first_ids = {log.id for log in Log.query}
+    archive_logs(app.config['LOG_ARCHIVE_DIR'], older_than_days=0)
+
+    # log 表清空后再写入：新日志重新从 1 开始编号，与第一次归档中的 id 重复
+    db.session.add_all([Museum(name='第二馆'), Category(name='陶瓷'), Dynasty(name='周')])
+    db.session.add(Artifact(museum_id=museum.id, name='新文物', category_id=jade.id))
+    artifacts[0].name = '第二次归档前修改'
+    db.session.commit()
+    assert {log.id for log in Log.query} & first_ids
+    archive_logs(app.config['LOG_ARCHIVE_DIR'], older_than_days=0)
+    assert Log.query.count() == 0
+    assert_consistent(app)
+
+    # 重建不应把正确的计数改小
+    before = materialized()['activity']
+    rebuild_stats(app.config['LOG_ARCHIVE_DIR'])
+    assert materialized()['activity'] == before
+    assert_consistent(app)
+
+
+def test_activity_slots_are_summed(app):
+    museum, artifacts, _ = make_artifacts()
+    for i, artifact in enumerate(artifacts):
+        artifact.name = f'改名{i}'
+        db.session.commit()
+    assert {row.slot for row in ActivityStat.query} <= set(range(ACTIVITY_SLOTS))
+    updates = [row.total for row in daily_activity(table_name='Artifact', action='update')]
+    assert updates == [len(artifacts)]
+    assert_consistent(app)
@@ -0,0 +1,56 @@
+"""登录用户缓存：用户在任一进程中被修改或删除后，缓存的旧数据不再使用"""
+from cache import load_cached_user, user_cache
+from models import db, User
+
+
+def make_user(role='admin'):
+    user = User(username='manager', role=role)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def reload(user_id):
+    db.session.remove()
+    return load_cached_user(user_id)
+
+
+def test_cached_user_is_served_while_unchanged(app):
+    user_id = make_user()
+    user_cache.clear()
+    assert reload(user_id).role == 'admin'
+    hits = user_cache.hits
+    assert reload(user_id).role == 'admin'
+    assert user_cache.hits == hits + 1
+
+
+def test_change_in_another_process_is_seen(app, monkeypatch):
+    user_id = make_user()
+    assert reload(user_id).role == 'admin'
+
+    # 模拟另一个进程修改：本进程的缓存条目不会被直接删除
+    monkeypatch.setattr(user_cache, 'invalidate', lambda user_id: None)
+    user = db.session.get(User, user_id)
+    user.role = 'guest'
+    db.session.commit()
+    assert reload(user_id).role == 'guest'
+
+    user = db.session.get(User, user_id)
+    user.set_password('changed')
+    db.session.commit()
+    assert reload(user_id).check_password('changed')
+
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+    assert reload(user_id) is None
+
+
+def test_cached_user_can_be_modified(app):
+    user_id = make_user()
+    reload(user_id)
+    user = reload(user_id)   # 命中缓存，merge(load=False) 得到的对象
+    user.set_password('changed')
+    db.session.commit()
+    assert db.session.get(User, user_id).auth_version == 1
+    assert reload(user_id).check_password('changed')